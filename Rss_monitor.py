@@ -1,19 +1,50 @@
+# 启动计时起点，供 --profile-startup 统计本模块的导入耗时
+import time
+_MODULE_START = time.perf_counter()
 import sqlite3
-import feedparser
 import yaml
-import requests
-import time
 import os
 import argparse
 import random
-from datetime import datetime
-import dingtalkchatbot.chatbot as cb
-from jinja2 import Template
+import re
+import hashlib
+import json
+import threading
+import queue
+import heapq
+import calendar
+import html
+import glob
+import gzip
+import zlib
+import bisect
+import socket
+import signal
+import io
+import importlib
+import importlib.util
+import sys
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+# feedparser、requests、jinja2以及各推送渠道的第三方库都在首次使用时才导入，
+# 只查询或只开启部分渠道时不必加载全部依赖
 
 
 
 __version__ = "1.1.9"
 
+# 各推送渠道每分钟最多发送的消息数（钉钉机器人官方限制为20条/分钟）
+DEFAULT_RATE_LIMITS = {
+    'dingding': 20,
+    'feishu': 100,
+    'tg_bot': 20,
+    'discard': 30
+}
+
 
 
 
@@ -54,6 +85,8 @@ def load_config():
     push_config['tg_bot']['token'] = os.environ.get('TELEGRAM_TOKEN', push_config['tg_bot'].get('token', ''))
     push_config['tg_bot']['group_id'] = os.environ.get('TELEGRAM_GROUP_ID', push_config['tg_bot'].get('group_id', ''))
     push_config['tg_bot']['switch'] = os.environ.get('TELEGRAM_SWITCH', push_config['tg_bot'].get('switch', 'OFF'))
+    # 自建Bot API服务或本地测试时可替换接口地址，默认使用官方地址
+    push_config['tg_bot']['api_url'] = os.environ.get('TELEGRAM_API_URL', push_config['tg_bot'].get('api_url', ''))
     
     # Discard推送配置 - 环境变量优先级高于配置文件
     if 'discard' not in push_config:
@@ -66,12 +99,120 @@ def load_config():
     
     # 添加夜间休眠配置
     config['night_sleep'] = {
-        'switch': os.environ.get('NIGHT_SLEEP_SWITCH', config.get('night_sleep', {}).get('switch', 'ON'))
+        'switch': os.environ.get('NIGHT_SLEEP_SWITCH', config.get('night_sleep', {}).get('switch', 'ON')),
+        'window': os.environ.get('NIGHT_SLEEP_WINDOW', config.get('night_sleep', {}).get('window', '0-7'))
+    }
+    
+    # 添加轮询调度配置（单位：秒）
+    scheduler_config = config.get('scheduler', {})
+    config['scheduler'] = {
+        'min_interval': int(os.environ.get('SCHEDULER_MIN_INTERVAL', scheduler_config.get('min_interval', 900))),
+        'max_interval': int(os.environ.get('SCHEDULER_MAX_INTERVAL', scheduler_config.get('max_interval', 21600))),
+        'default_interval': int(scheduler_config.get('default_interval', 10800))
     }
     
     # 添加生成日报配置
+    daily_report_config = config.get('daily_report', {})
     config['daily_report'] = {
-        'switch': os.environ.get('DAILY_REPORT_SWITCH', config.get('daily_report', {}).get('switch', 'ON'))
+        'switch': os.environ.get('DAILY_REPORT_SWITCH', daily_report_config.get('switch', 'ON')),
+        # HTML日报每页的文章数，超过时分页
+        'page_size': int(os.environ.get('DAILY_REPORT_PAGE_SIZE', daily_report_config.get('page_size', 500)))
+    }
+    
+    # 添加并发抓取配置
+    fetch_config = config.get('fetch', {})
+    config['fetch'] = {
+        'max_workers': int(os.environ.get('FETCH_MAX_WORKERS', fetch_config.get('max_workers', 16))),
+        'per_host': int(os.environ.get('FETCH_PER_HOST', fetch_config.get('per_host', 4))),
+        'connect_timeout': float(os.environ.get('FETCH_CONNECT_TIMEOUT', fetch_config.get('connect_timeout', 10))),
+        # 兼容旧版配置中的 timeout 字段
+        'read_timeout': float(os.environ.get('FETCH_TIMEOUT', fetch_config.get('read_timeout', fetch_config.get('timeout', 30)))),
+        'total_timeout': float(os.environ.get('FETCH_TOTAL_TIMEOUT', fetch_config.get('total_timeout', 60))),
+        'max_bytes': int(os.environ.get('FETCH_MAX_BYTES', fetch_config.get('max_bytes', 5 * 1024 * 1024)))
+    }
+    
+    # 添加熔断配置：连续失败的RSS源暂停抓取，退避时间按指数增长
+    breaker_config = config.get('circuit_breaker', {})
+    config['circuit_breaker'] = {
+        'failure_threshold': int(breaker_config.get('failure_threshold', 3)),
+        'base_backoff': float(breaker_config.get('base_backoff', 3600)),
+        'max_backoff': float(breaker_config.get('max_backoff', 7 * 86400))
+    }
+    
+    # 添加推送分发配置
+    dispatch_config = config.get('dispatch', {})
+    config['dispatch'] = {
+        'batch_size': int(os.environ.get('DISPATCH_BATCH_SIZE', dispatch_config.get('batch_size', 10))),
+        'batch_window': float(os.environ.get('DISPATCH_BATCH_WINDOW', dispatch_config.get('batch_window', 2))),
+        'rate_limits': dict(DEFAULT_RATE_LIMITS, **(dispatch_config.get('rate_limits') or {}))
+    }
+    
+    # 添加推送发件箱（失败重试）配置
+    outbox_config = config.get('outbox', {})
+    config['outbox'] = {
+        'max_attempts': int(os.environ.get('OUTBOX_MAX_ATTEMPTS', outbox_config.get('max_attempts', 8))),
+        'base_delay': float(outbox_config.get('base_delay', 30)),
+        'max_delay': float(outbox_config.get('max_delay', 3600)),
+        'flush_timeout': float(outbox_config.get('flush_timeout', 120))
+    }
+    
+    # 添加运行指标配置：Prometheus文本格式的指标接口和每轮的JSON汇总
+    metrics_config = config.get('metrics', {})
+    config['metrics'] = {
+        'switch': os.environ.get('METRICS_SWITCH', metrics_config.get('switch', 'OFF')),
+        'host': os.environ.get('METRICS_HOST', metrics_config.get('host', '127.0.0.1')),
+        'port': int(os.environ.get('METRICS_PORT', metrics_config.get('port', 9108))),
+        'summary': os.environ.get('METRICS_SUMMARY', metrics_config.get('summary', 'ON'))
+    }
+    
+    # 添加近似重复检测配置：同一篇文章被多个镜像/聚合源转载时只推送一次
+    dedup_config = config.get('dedup', {})
+    config['dedup'] = {
+        'switch': os.environ.get('DEDUP_SWITCH', dedup_config.get('switch', 'ON')),
+        # suppress：重复文章不推送、日报中不显示；group：推送时注明原文，日报中归到原文下
+        'mode': os.environ.get('DEDUP_MODE', dedup_config.get('mode', 'suppress')),
+        'max_distance': int(dedup_config.get('max_distance', 3)),
+        'window_days': int(dedup_config.get('window_days', 7)),
+        'mirror_hosts': dict(dedup_config.get('mirror_hosts') or {})
+    }
+    
+    # 添加推送规则配置：按关键词、正则、CVE编号和来源决定文章推送到哪些渠道
+    rules_config = config.get('rules', {})
+    config['rules'] = {
+        'switch': os.environ.get('RULES_SWITCH', rules_config.get('switch', 'OFF')),
+        # 没有命中任何规则的文章推送到哪些渠道："all" 表示所有开启的渠道，空列表表示不推送
+        'default_channels': rules_config.get('default_channels', 'all'),
+        'rules': list(rules_config.get('rules') or [])
+    }
+    
+    # 添加数据保留配置：只保留最近的文章，更早的按月归档为压缩的JSONL，已归档链接只保留哈希用于去重
+    retention_config = config.get('retention', {})
+    config['retention'] = {
+        'switch': os.environ.get('RETENTION_SWITCH', retention_config.get('switch', 'ON')),
+        'hot_days': int(os.environ.get('RETENTION_HOT_DAYS', retention_config.get('hot_days', 30))),
+        'archive_dir': retention_config.get('archive_dir', 'archive/db')
+    }
+    
+    # 添加循环模式的守护进程配置：WAL日志、定期检查点和收到退出信号后的等待时间
+    daemon_config = config.get('daemon', {})
+    config['daemon'] = {
+        'wal': os.environ.get('DAEMON_WAL', daemon_config.get('wal', 'ON')),
+        'checkpoint_interval': int(daemon_config.get('checkpoint_interval', 600)),
+        'shutdown_timeout': int(os.environ.get('DAEMON_SHUTDOWN_TIMEOUT', daemon_config.get('shutdown_timeout', 30)))
+    }
+    
+    # 添加分片配置：多个实例分摊rss.yaml中的源，通过共享的认领库保证每个链接只推送一次
+    shard_config = config.get('shard', {})
+    config['shard'] = {
+        # 格式为 "i/N"，i从0开始，例如 "0/3"；为空表示不分片
+        'shard': os.environ.get('SHARD', shard_config.get('shard', '')),
+        'vnodes': int(shard_config.get('vnodes', 64)),
+        'claim_backend': os.environ.get('CLAIM_BACKEND', shard_config.get('claim_backend', 'OFF')),
+        'claim_path': os.environ.get('CLAIM_PATH', shard_config.get('claim_path', 'shared/claims.db')),
+        'claim_retention_days': int(shard_config.get('claim_retention_days', 30)),
+        # 认领后到本地写入发件箱之间的租约（秒），实例中途退出时其他实例等租约过期后接手
+        'claim_lease': int(shard_config.get('claim_lease', 300)),
+        'node': os.environ.get('NODE_NAME', shard_config.get('node', '')) or socket.gethostname()
     }
     
     # 加载代理配置
@@ -86,29 +227,632 @@ def load_config():
     config['push'] = push_config
     return config
 
-# 判断是否应该进行夜间休眠
-def should_sleep():
-    # 加载配置
-    config = load_config()
-    # 检查是否开启夜间休眠功能
-    sleep_switch = os.environ.get('NIGHT_SLEEP_SWITCH', config.get('night_sleep', {}).get('switch', 'ON'))
-    if sleep_switch != 'ON':
-        return False
+# 加载RSS源配置
+def load_rss_config():
+    with open('rss.yaml', 'r', encoding='utf-8') as file:
+        return yaml.load(file, Loader=yaml.FullLoader) or {}
+
+# 递归冻结配置，得到只读的配置对象
+def freeze_config(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_config(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_config(item) for item in value)
+    return value
+
+# 配置快照：只在config.yaml或rss.yaml的修改时间变化时才重新解析
+CONFIG_FILES = ('config.yaml', 'rss.yaml')
+_config_lock = threading.Lock()
+_config_snapshot = {'mtimes': None, 'config': None, 'rss': None}
+
+def _config_mtimes():
+    mtimes = []
+    for path in CONFIG_FILES:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+# 获取当前配置快照，文件变化时自动热加载
+def get_config():
+    with _config_lock:
+        mtimes = _config_mtimes()
+        if _config_snapshot['mtimes'] != mtimes:
+            if _config_snapshot['mtimes'] is not None:
+                print("检测到配置文件变化，重新加载配置")
+            _config_snapshot['config'] = freeze_config(load_config())
+            try:
+                _config_snapshot['rss'] = freeze_config(load_rss_config())
+            except Exception as e:
+                # rss.yaml有误时沿用上一次成功加载的RSS源
+                print(f"加载rss.yaml文件出错: {str(e)}")
+            _config_snapshot['mtimes'] = mtimes
+        return _config_snapshot['config']
+
+# 获取当前RSS源配置快照，首次加载失败时返回None
+def get_rss_config():
+    get_config()
+    return _config_snapshot['rss']
+
+# 解析休眠时段，格式为 "0-7"（北京时间，包含开始小时，不包含结束小时），关闭时返回None
+def parse_sleep_window(window):
+    if not window or str(window).upper() == 'OFF':
+        return None
+    try:
+        start, end = (int(part) % 24 for part in str(window).split('-', 1))
+    except ValueError:
+        print(f"休眠时段格式错误: {window}，应为 \"开始小时-结束小时\"")
+        return None
+    return (start, end) if start != end else None
+
+# 获取时间戳对应的北京时间（UTC+8）
+def beijing_time(ts=None):
+    return datetime.utcfromtimestamp((time.time() if ts is None else ts) + 8 * 3600)
+
+# 判断北京时间的小时数是否落在休眠时段内，支持跨零点（如 "23-6"）
+def in_sleep_window(window, hour):
+    start, end = window
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+# 如果时间点落在休眠时段内，顺延到休眠结束的时间
+def defer_past_sleep_window(window, ts):
+    if not window:
+        return ts
+    now_bj = beijing_time(ts)
+    if not in_sleep_window(window, now_bj.hour):
+        return ts
+    wake_bj = now_bj.replace(minute=0, second=0, microsecond=0) + timedelta(hours=(window[1] - now_bj.hour) % 24)
+    return calendar.timegm(wake_bj.timetuple()) - 8 * 3600
+
+# 获取全局夜间休眠时段
+def global_sleep_window(config):
+    night_sleep = config.get('night_sleep', {})
+    if night_sleep.get('switch', 'ON') != 'ON':
+        return None
+    return parse_sleep_window(night_sleep.get('window', '0-7'))
+
+# RSS源中 sy:updatePeriod 对应的秒数
+UPDATE_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 7 * 86400,
+    'monthly': 30 * 86400,
+    'yearly': 365 * 86400
+}
+
+# 读取RSS源自身声明的更新间隔（ttl 或 sy:updatePeriod/sy:updateFrequency），单位秒
+def feed_interval_hint(file_data):
+    feed = file_data.get('feed', {})
+    hints = []
+    try:
+        if feed.get('ttl'):
+            hints.append(int(feed.get('ttl')) * 60)
+    except (TypeError, ValueError):
+        pass
+    period = UPDATE_PERIODS.get(str(feed.get('sy_updateperiod', '')).strip().lower())
+    if period:
+        try:
+            frequency = max(1, int(feed.get('sy_updatefrequency') or 1))
+        except (TypeError, ValueError):
+            frequency = 1
+        hints.append(period // frequency)
+    return max(hints) if hints else None
+
+# 根据最近文章的发布时间估算发布间隔：取平均间隔与距最新一篇的时间中较大者的一半，
+# 更新频繁的源间隔变短，长期不更新的源间隔变长
+def observed_publish_interval(file_data, now=None, sample=20):
+    now = time.time() if now is None else now
+    published = sorted(
+        calendar.timegm(entry.get('published_parsed') or entry.get('updated_parsed'))
+        for entry in file_data.get('entries', [])
+        if entry.get('published_parsed') or entry.get('updated_parsed')
+    )[-sample:]
+    if len(published) < 2:
+        return None
+    average_gap = (published[-1] - published[0]) / (len(published) - 1)
+    return max(average_gap, now - published[-1]) / 2
+
+# 自适应轮询调度器：用优先队列记录每个RSS源的下次抓取时间
+class FeedScheduler:
+    def __init__(self, config):
+        self.heap = []
+        self.state = {}
+        self.update_config(config)
+
+    def update_config(self, config):
+        self.config = config
+        scheduler_config = config.get('scheduler', {})
+        self.min_interval = scheduler_config.get('min_interval', 900)
+        self.max_interval = max(self.min_interval, scheduler_config.get('max_interval', 21600))
+        self.default_interval = scheduler_config.get('default_interval', 10800)
+        self.default_window = global_sleep_window(config)
+
+    # RSS源的休眠时段：rss.yaml中的 sleep_window 优先，否则使用全局夜间休眠配置
+    def sleep_window(self, feed_config):
+        if 'sleep_window' in feed_config:
+            return parse_sleep_window(feed_config.get('sleep_window'))
+        return self.default_window
+
+    # 与最新的rss.yaml同步：新增的源立即到期，删除的源不再调度
+    def sync(self, rss_config, now=None):
+        now = time.time() if now is None else now
+        for key in list(self.state):
+            if key not in rss_config:
+                del self.state[key]
+        for key, feed_config in rss_config.items():
+            state = self.state.get(key)
+            if state is None:
+                state = self.state[key] = {'interval': self.default_interval, 'hint': None,
+                                           'observed': None, 'failures': 0, 'next_due': now}
+                heapq.heappush(self.heap, (now, key))
+            state['window'] = self.sleep_window(feed_config)
+
+    # 取出所有已到期（且不在休眠时段内）的源
+    def pop_due(self, now=None):
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            next_due, key = heapq.heappop(self.heap)
+            state = self.state.get(key)
+            # 已删除的源或过期的堆记录直接丢弃
+            if state is None or state['next_due'] != next_due:
+                continue
+            deferred = defer_past_sleep_window(state['window'], next_due)
+            if deferred > now:
+                self._schedule(key, deferred)
+                continue
+            due.append(key)
+        return due
+
+    # 下一个源到期的时间，没有任何源时返回None
+    def next_due(self):
+        while self.heap:
+            next_due, key = self.heap[0]
+            state = self.state.get(key)
+            if state is not None and state['next_due'] == next_due:
+                return next_due
+            heapq.heappop(self.heap)
+        return None
+
+    # 记录解析结果中的发布频率和更新间隔提示
+    def observe(self, key, file_data, now=None):
+        state = self.state.get(key)
+        if state is None:
+            return
+        state['hint'] = feed_interval_hint(file_data)
+        observed = observed_publish_interval(file_data, now)
+        if observed is not None:
+            state['observed'] = observed
+
+    # 一次抓取完成后计算下次抓取时间：失败次数越多间隔越长（指数退避）
+    def complete(self, key, success, now=None):
+        now = time.time() if now is None else now
+        state = self.state.get(key)
+        if state is None:
+            return
+        state['failures'] = 0 if success else state['failures'] + 1
+        interval = state['observed'] or self.default_interval
+        # RSS源声明的ttl/更新周期是建议的最短轮询间隔
+        if state['hint']:
+            interval = max(interval, state['hint'])
+        interval *= 2 ** min(state['failures'], 6)
+        state['interval'] = min(self.max_interval, max(self.min_interval, interval))
+        self._schedule(key, defer_past_sleep_window(state['window'], now + state['interval']))
+
+    def _schedule(self, key, next_due):
+        self.state[key]['next_due'] = next_due
+        heapq.heappush(self.heap, (next_due, key))
+    
+    # 恢复上次运行保存的调度状态，重启后按原计划继续，而不是立即抓取全部源
+    def load(self, cursor, now=None):
+        now = time.time() if now is None else now
+        cursor.execute("SELECT source, interval, hint, observed, failures, next_due FROM scheduler_state")
+        for source, interval, hint, observed, failures, next_due in cursor.fetchall():
+            # 调小了最长间隔时，不再等待按旧配置算出的时间
+            next_due = min(next_due, now + self.max_interval)
+            self.state[source] = {'interval': interval, 'hint': hint, 'observed': observed,
+                                  'failures': failures, 'next_due': next_due}
+            heapq.heappush(self.heap, (next_due, source))
+        return len(self.state)
+    
+    # 保存当前调度状态（需由调用方提交事务）；已取出但未完成的源保留原到期时间，重启后立即重新抓取
+    def save(self, cursor):
+        cursor.execute("DELETE FROM scheduler_state")
+        cursor.executemany(
+            "INSERT INTO scheduler_state (source, interval, hint, observed, failures, next_due) VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, state['interval'], state['hint'], state['observed'], state['failures'], state['next_due'])
+             for key, state in self.state.items()]
+        )
+
+# 解析分片参数 "i/N"（i从0开始），不分片时返回None
+def parse_shard(value):
+    if not value:
+        return None
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', str(value))
+    if not match:
+        raise ValueError(f"分片参数格式错误: {value}，应为 i/N，例如 0/3")
+    index, total = int(match.group(1)), int(match.group(2))
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片参数超出范围: {value}，i 应在 0 到 N-1 之间")
+    return index, total
+
+# 一致性哈希环：源按key分配到分片，增减分片时只有少量源需要迁移
+class HashRing:
+    def __init__(self, total, vnodes=64):
+        self.total = total
+        points = []
+        for shard in range(total):
+            for replica in range(vnodes):
+                points.append((self._hash(f'shard-{shard}-{replica}'), shard))
+        points.sort()
+        self.keys = [point for point, _ in points]
+        self.shards = [shard for _, shard in points]
+    
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.sha1(value.encode('utf-8')).digest()[:8], 'big')
+    
+    def shard_of(self, key):
+        index = bisect.bisect(self.keys, self._hash(key)) % len(self.keys)
+        return self.shards[index]
+
+# 只保留属于当前分片的源
+def filter_shard(rss_config, shard, vnodes=64):
+    if shard is None:
+        return rss_config
+    index, total = shard
+    ring = HashRing(total, vnodes)
+    return {key: value for key, value in rss_config.items() if ring.shard_of(key) == index}
+
+# 链接认领库：多个实例共享，同一链接只有第一个认领成功的实例会推送。认领分两步：
+# claim 先占用（pending，带租约），文章和发件箱在本地提交后再 confirm。实例在两步之间退出时，
+# 租约过期后其他实例可以接手，不会因为认领了却没有写入发件箱而漏推。
+# 后端需实现 claim(hashes) -> (认领成功的哈希集合, 其他实例占用中尚未确认的哈希集合)、confirm(hashes) 和 close()
+class MemoryClaimStore:
+    def __init__(self, config=None):
+        config = config or {}
+        self.node = config.get('node')
+        self.lease = config.get('claim_lease', 300)
+        self.lock = threading.Lock()
+        self.claimed = {}
+    
+    def claim(self, hashes):
+        now = time.time()
+        won, busy = set(), set()
+        with self.lock:
+            for key in hashes:
+                node, state, expires_at = self.claimed.get(key, (None, None, 0))
+                if state == 'confirmed':
+                    continue
+                if state == 'pending' and node != self.node and expires_at > now:
+                    busy.add(key)
+                    continue
+                self.claimed[key] = (self.node, 'pending', now + self.lease)
+                won.add(key)
+        return won, busy
+    
+    def confirm(self, hashes):
+        with self.lock:
+            for key in hashes:
+                if self.claimed.get(key, (None,))[0] == self.node:
+                    self.claimed[key] = (self.node, 'confirmed', None)
     
-    # 判断当前时间（北京时间）是否在0-7点之间
-    # 获取当前UTC时间，转换为北京时间（UTC+8）
-    now_utc = datetime.utcnow()
-    # 转换为北京时间
-    now_bj = now_utc.hour + 8
-    # 处理跨天情况
-    if now_bj >= 24:
-        now_bj -= 24
+    def close(self):
+        pass
+
+# 基于SQLite的认领库，放在各实例共享的卷上。WAL模式依赖共享内存，
+# 只适用于同一台主机上的多个进程或容器，不能放在NFS等网络文件系统上
+class SqliteClaimStore:
+    def __init__(self, config):
+        path = config.get('claim_path', 'shared/claims.db')
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.node = config.get('node')
+        self.lease = config.get('claim_lease', 300)
+        # 手动管理事务，认领时用 BEGIN IMMEDIATE 先拿到写锁，避免两个实例同时判定为未认领
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS claims (
+            link_hash TEXT PRIMARY KEY,
+            node TEXT,
+            claimed_at REAL,
+            state TEXT NOT NULL DEFAULT 'confirmed',
+            expires_at REAL
+        )''')
+        # 旧版认领库没有状态字段，已有记录都视为已确认
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(claims)")}
+        if 'state' not in columns:
+            self.conn.execute("ALTER TABLE claims ADD COLUMN state TEXT NOT NULL DEFAULT 'confirmed'")
+            self.conn.execute("ALTER TABLE claims ADD COLUMN expires_at REAL")
+        retention_days = config.get('claim_retention_days', 30)
+        if retention_days > 0:
+            self.conn.execute("DELETE FROM claims WHERE claimed_at < ?", (time.time() - retention_days * 86400,))
+    
+    def claim(self, hashes, batch_size=500):
+        hashes = list(dict.fromkeys(hashes))
+        if not hashes:
+            return set(), set()
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            taken, busy = set(), set()
+            for i in range(0, len(hashes), batch_size):
+                batch = hashes[i:i + batch_size]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT link_hash, node, state, expires_at FROM claims WHERE link_hash IN ({placeholders})", batch
+                )
+                for key, node, state, expires_at in rows:
+                    if state == 'confirmed':
+                        taken.add(key)
+                    elif node != self.node and (expires_at or 0) > now:
+                        busy.add(key)
+            # 没有记录、租约已过期或本实例之前占用的链接都由本实例（重新）占用
+            won = [key for key in hashes if key not in taken and key not in busy]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO claims (link_hash, node, claimed_at, state, expires_at) VALUES (?, ?, ?, 'pending', ?)",
+                [(key, self.node, now, now + self.lease) for key in won]
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return set(won), busy
     
-    return now_bj < 7
+    # 本地提交后确认认领，只确认仍由本实例占用的链接
+    def confirm(self, hashes, batch_size=500):
+        hashes = list(dict.fromkeys(hashes))
+        for i in range(0, len(hashes), batch_size):
+            batch = hashes[i:i + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            self.conn.execute(
+                f"UPDATE claims SET state = 'confirmed', expires_at = NULL WHERE node = ? AND link_hash IN ({placeholders})",
+                [self.node, *batch]
+            )
+    
+    def close(self):
+        self.conn.close()
+
+# 认领库后端注册表，可按名称扩展其他共享存储
+CLAIM_BACKENDS = {
+    'sqlite': SqliteClaimStore,
+    'memory': MemoryClaimStore,
+}
+
+# 根据配置创建认领库，未开启时返回None
+def open_claim_store(config=None):
+    shard_config = (config or get_config()).get('shard', {})
+    backend = str(shard_config.get('claim_backend', 'OFF'))
+    if backend.upper() == 'OFF':
+        return None
+    if backend not in CLAIM_BACKENDS:
+        raise ValueError(f"未知的认领库后端: {backend}，可选 {', '.join(CLAIM_BACKENDS)}")
+    return CLAIM_BACKENDS[backend](shard_config)
+
+# 上次运行在本地提交后、确认认领前退出时，启动时重新确认租约期内写入发件箱的链接，
+# 避免租约过期后其他实例重复推送
+def confirm_recent_claims(cursor, claim_store):
+    cursor.execute(
+        "SELECT DISTINCT items.link_hash FROM outbox JOIN items ON items.id = outbox.item_id WHERE outbox.created_at >= ?",
+        (time.time() - claim_store.lease,)
+    )
+    claim_store.confirm([row[0] for row in cursor.fetchall()])
+
+# 链接中的跟踪参数，去重时忽略（utm_ 开头的参数另行处理）
+TRACKING_PARAMS = {
+    'spm', 'from', 'isappinstalled', 'scene', 'chksm', 'srcid', 'clicktime', 'enterid', 'sharer_sharetime',
+    'sharer_shareid', 'ref', 'ref_src', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'mkt_tok'
+}
+
+# 规范化链接：协议和域名转小写，去掉默认端口和跟踪参数，其余参数排序，用于去重。
+# 锚点保留：有的源用锚点区分不同条目（如 https://leak-lookup.com/breaches#<站点>）
+def normalize_link(link):
+    link = (link or '').strip()
+    try:
+        parsed = urlparse(link)
+    except ValueError:
+        return link
+    netloc = parsed.netloc.lower()
+    if (parsed.scheme.lower(), netloc.rsplit(':', 1)[-1]) in (('http', '80'), ('https', '443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunparse((parsed.scheme.lower(), netloc, parsed.path or '/', parsed.params, query, parsed.fragment))
+
+# 规范化链接的哈希，作为items表的唯一键
+def link_hash(link):
+    return hashlib.sha1(normalize_link(link).encode('utf-8')).hexdigest()
+
+# 按当前的规范化规则重新计算所有文章的链接哈希（调用前需删除唯一索引）。
+# 迁移不删除历史文章：规范化后与更早的文章冲突的行保留原哈希，没有原哈希时改用原始链接的哈希，
+# 原始链接也完全相同时加上id区分。新抓取的文章按新哈希写入，冲突由 INSERT OR IGNORE 处理
+def rehash_items(conn):
+    taken = set()
+    updates = []
+    for item_id, link, old_hash in conn.execute("SELECT id, link, link_hash FROM items ORDER BY id").fetchall():
+        raw_hash = hashlib.sha1((link or '').encode('utf-8')).hexdigest()
+        for key in (link_hash(link), old_hash, raw_hash, f'{raw_hash}-{item_id}'):
+            if key and key not in taken:
+                break
+        taken.add(key)
+        if key != old_hash:
+            updates.append((key, item_id))
+    conn.executemany("UPDATE items SET link_hash = ? WHERE id = ?", updates)
+
+# 数据库迁移 v1：增加链接哈希唯一索引、时间索引和来源字段
+def migrate_v1(conn):
+    conn.execute("ALTER TABLE items ADD COLUMN link_hash TEXT")
+    conn.execute("ALTER TABLE items ADD COLUMN source TEXT")
+    rehash_items(conn)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_link_hash ON items(link_hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_timestamp ON items(timestamp)")
+
+# 数据库迁移 v2：推送发件箱，每篇文章每个渠道一条待投递记录
+def migrate_v2(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER,
+        channel TEXT NOT NULL,
+        title TEXT,
+        content TEXT,
+        extra_data TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL,
+        delivered_at REAL,
+        last_error TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+# 数据库迁移 v3：RSS源健康状态，用于熔断和 --feed-status 查看
+def migrate_v3(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS feed_health (
+        source TEXT PRIMARY KEY,
+        feed_url TEXT,
+        state TEXT NOT NULL DEFAULT 'closed',
+        consecutive_failures INTEGER NOT NULL DEFAULT 0,
+        open_until REAL,
+        last_success REAL,
+        last_failure REAL,
+        last_status INTEGER,
+        last_error TEXT,
+        avg_latency REAL,
+        avg_bytes REAL,
+        total_checks INTEGER NOT NULL DEFAULT 0
+    )''')
+
+# 数据库迁移 v4：链接规范化忽略跟踪参数后重新计算链接哈希（不删除历史文章）；增加内容指纹和重复来源字段
+def migrate_v4(conn):
+    # 先删除唯一索引，重新计算期间哈希可能暂时重复
+    conn.execute("DROP INDEX IF EXISTS idx_items_link_hash")
+    rehash_items(conn)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_link_hash ON items(link_hash)")
+    conn.execute("ALTER TABLE items ADD COLUMN simhash INTEGER")
+    conn.execute("ALTER TABLE items ADD COLUMN dup_of INTEGER")
+
+# 创建全文索引表，优先使用trigram分词（支持中文子串搜索，需要SQLite 3.34+），否则退回unicode61
+def create_items_fts(conn, columns='title, link UNINDEXED, source, summary', options="content='items', content_rowid='id'"):
+    for tokenizer in ('trigram', 'unicode61'):
+        try:
+            conn.execute(
+                f"CREATE VIRTUAL TABLE items_fts USING fts5({columns}, "
+                f"{options + ', ' if options else ''}tokenize='{tokenizer}')"
+            )
+            return tokenizer
+        except sqlite3.OperationalError:
+            continue
+    return None
+
+# 数据库迁移 v5：增加摘要字段和FTS5全文索引，通过触发器与items表保持同步
+def migrate_v5(conn):
+    conn.execute("ALTER TABLE items ADD COLUMN summary TEXT")
+    tokenizer = create_items_fts(conn)
+    if tokenizer is None:
+        print("当前SQLite不支持FTS5，全文搜索不可用")
+        return
+    conn.execute('''CREATE TRIGGER items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, title, link, source, summary)
+        VALUES (new.id, new.title, new.link, new.source, new.summary);
+    END''')
+    conn.execute('''CREATE TRIGGER items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, title, link, source, summary)
+        VALUES ('delete', old.id, old.title, old.link, old.source, old.summary);
+    END''')
+    conn.execute('''CREATE TRIGGER items_fts_update AFTER UPDATE OF title, link, source, summary ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, title, link, source, summary)
+        VALUES ('delete', old.id, old.title, old.link, old.source, old.summary);
+        INSERT INTO items_fts (rowid, title, link, source, summary)
+        VALUES (new.id, new.title, new.link, new.source, new.summary);
+    END''')
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+
+# 数据库迁移 v6：已归档文章的链接哈希表（取SHA1前8字节作为整数主键，每条约十几个字节）
+def migrate_v6(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS seen_links (hash INTEGER PRIMARY KEY)")
+
+# 数据库迁移 v7：循环模式的调度状态，重启后恢复各源的轮询间隔和下次抓取时间
+def migrate_v7(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS scheduler_state (
+        source TEXT PRIMARY KEY,
+        interval REAL NOT NULL,
+        hint REAL,
+        observed REAL,
+        failures INTEGER NOT NULL DEFAULT 0,
+        next_due REAL NOT NULL
+    )''')
+
+# 全文索引的字段：只索引标题、来源和摘要，链接和收录时间按rowid从items表读取
+FTS_COLUMNS = 'title, source, summary'
+
+# 摘要压缩存储：zlib压缩后更小时存为BLOB，否则保留文本（很短的摘要压缩后反而更大）
+def pack_summary(text):
+    if not text:
+        return None
+    data = text.encode('utf-8')
+    packed = zlib.compress(data, 9)
+    return packed if len(packed) < len(data) else text
+
+# 读取摘要：BLOB为压缩后的摘要，文本原样返回
+def unpack_summary(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+# 数据库迁移 v8：记录文章的发布时间（UTC时间戳）、作者和标签，摘要改为压缩存储。
+# 全文索引改为无内容（content=''）的FTS5表：只保存倒排索引，不再保存一份明文摘要，
+# 由程序在写入和归档文章时同步（见index_items、unindex_items）。不使用触发器和自定义函数，
+# sqlite3命令行等普通客户端也能直接修改items表；搜索时按rowid关联items，已删除的文章不会出现在结果中
+def migrate_v8(conn):
+    conn.execute("ALTER TABLE items ADD COLUMN published INTEGER")
+    conn.execute("ALTER TABLE items ADD COLUMN author TEXT")
+    conn.execute("ALTER TABLE items ADD COLUMN tags TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_published ON items(published)")
+    had_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is not None
+    for trigger in ('items_fts_insert', 'items_fts_delete', 'items_fts_update'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS items_fts")
+    if had_fts and create_items_fts(conn, FTS_COLUMNS, "content=''") is not None:
+        conn.execute("INSERT INTO items_fts (rowid, title, source, summary) SELECT id, title, source, summary FROM items")
+    rows = conn.execute("SELECT id, summary FROM items WHERE summary IS NOT NULL").fetchall()
+    conn.executemany("UPDATE items SET summary = ? WHERE id = ?",
+                     [(pack_summary(summary), item_id) for item_id, summary in rows])
+
+# 按顺序执行的数据库迁移，版本号记录在 PRAGMA user_version 中
+MIGRATIONS = [
+    migrate_v1,
+    migrate_v2,
+    migrate_v3,
+    migrate_v4,
+    migrate_v5,
+    migrate_v6,
+    migrate_v7,
+    migrate_v8,
+]
+
+# 将数据库升级到最新版本，每个迁移在独立事务中执行
+def migrate_database(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"正在升级数据库到版本 {target}...")
+        try:
+            conn.execute("BEGIN")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 # 初始化数据库
-def init_database():
-    conn = sqlite3.connect('articles.db')
+def init_database(path='articles.db'):
+    conn = sqlite3.connect(path)
     cursor = conn.cursor()
     cursor.execute('''CREATE TABLE IF NOT EXISTS items (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -116,46 +860,1271 @@ def init_database():
         link TEXT,
         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    # 条件请求缓存：记录每个RSS源的ETag、Last-Modified和内容哈希
+    cursor.execute('''CREATE TABLE IF NOT EXISTS feed_cache (
+        feed_url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        body_hash TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
     conn.commit()
+    migrate_database(conn)
     return conn
 
-# 获取数据并检查更新
-def check_for_updates(feed_url, site_name, cursor, conn, send_push=True):
+# 循环模式使用WAL日志：写入时不阻塞 --search 等只读查询，提交时只追加WAL文件，减少长时间运行的写放大
+def enable_wal(conn):
+    mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if mode.lower() != 'wal':
+        print(f"数据库不支持WAL模式，继续使用 {mode} 日志")
+        return False
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return True
+
+# 将WAL中的内容写回数据库文件并截断WAL，避免WAL文件随运行时间增长
+def checkpoint_database(conn):
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    except sqlite3.Error as e:
+        print(f"数据库检查点失败: {str(e)}")
+        return False
+    return busy == 0
+
+# 退出前恢复为默认的回滚日志模式，数据库保持单个文件（GitHub Action会将其提交到仓库）
+def disable_wal(conn):
+    if checkpoint_database(conn):
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+# 注册SIGTERM/SIGINT处理：第一次收到信号时设置停止标志，完成正在进行的抓取和推送后退出；再次收到则立即退出
+def install_signal_handlers(stop_event):
+    def handler(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        print(f"收到信号 {signal.Signals(signum).name}，完成当前任务后退出（再次发送信号立即退出）")
+        stop_event.set()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handler)
+
+# 读取所有RSS源的条件请求缓存 {feed_url: (etag, last_modified, body_hash)}
+def load_feed_cache(cursor):
+    cursor.execute("SELECT feed_url, etag, last_modified, body_hash FROM feed_cache")
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+# 保存RSS源的条件请求缓存（只在主线程中调用）
+def save_feed_cache(cursor, fetched):
+    headers = fetched.get('headers') or {}
+    cursor.execute(
+        "INSERT OR REPLACE INTO feed_cache (feed_url, etag, last_modified, body_hash, updated_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (fetched['url'], headers.get('ETag'), headers.get('Last-Modified'), fetched.get('body_hash'))
+    )
+
+# 可接受的压缩格式，安装了brotli时额外支持br（只检查是否安装，由urllib3在解压时导入）
+ACCEPT_ENCODING = 'gzip, deflate, br' if importlib.util.find_spec('brotli') else 'gzip, deflate'
+
+# 单个RSS源的抓取参数：rss.yaml中的设置优先于config.yaml中的全局默认值
+def feed_fetch_options(feed_config, fetch_config):
+    return {
+        'timeout': (
+            float(feed_config.get('connect_timeout', fetch_config.get('connect_timeout', 10))),
+            float(feed_config.get('read_timeout', fetch_config.get('read_timeout', 30)))
+        ),
+        'total_timeout': float(feed_config.get('total_timeout', fetch_config.get('total_timeout', 60))),
+        'max_bytes': int(feed_config.get('max_bytes', fetch_config.get('max_bytes', 5 * 1024 * 1024)))
+    }
+
+# 流式读取响应内容（已按Content-Encoding解压），超过max_bytes或超过截止时间时中止下载。
+# read_timeout只限制两次收到数据的间隔，服务器持续缓慢发送时由deadline结束下载；
+# urllib3 2.3+ 的read1收到数据即返回，每次读取后都能检查截止时间（旧版退回iter_content）
+def read_limited(response, max_bytes, deadline=None):
+    content_length = response.headers.get('Content-Length')
+    if max_bytes and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise ValueError(f"响应大小 {content_length} 字节超过上限 {max_bytes} 字节")
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is not None:
+        chunks = iter(lambda: read1(64 * 1024, decode_content=True), b'')
+    else:
+        chunks = response.iter_content(chunk_size=64 * 1024)
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        if max_bytes and len(buffer) > max_bytes:
+            raise ValueError(f"响应大小超过上限 {max_bytes} 字节")
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError(f"下载超时，已接收 {len(buffer)} 字节")
+    return bytes(buffer)
+
+# 下载单个RSS源（在抓取线程中执行，不访问数据库），只返回原始字节，解析交给主线程
+def fetch_feed(feed_url, host_limits=None, timeout=(10, 30), validators=None, session=None, max_bytes=None,
+               total_timeout=None):
+    import feedparser
+    import requests
+    result = {
+        'url': feed_url,
+        'content': None,
+        'headers': {},
+        'status': None,
+        'error': None,
+        'elapsed': 0.0,
+        'body_hash': None,
+        'not_modified': False,
+        'unchanged': False
+    }
+    etag, last_modified, body_hash = validators or (None, None, None)
+    request_headers = {'User-Agent': feedparser.USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING}
+    if etag:
+        request_headers['If-None-Match'] = etag
+    if last_modified:
+        request_headers['If-Modified-Since'] = last_modified
+    start = time.time()
+    try:
+        host = urlparse(feed_url).netloc
+        # 同一主机的并发数由信号量限制，避免同时压垮同一个镜像站
+        semaphore = host_limits.get(host) if host_limits else None
+        if semaphore:
+            semaphore.acquire()
+        try:
+            # 总超时从拿到主机并发名额开始计算，排队等待的时间不计入
+            deadline = time.time() + total_timeout if total_timeout else None
+            with (session or requests).get(feed_url, headers=request_headers, timeout=timeout, stream=True) as response:
+                result['status'] = response.status_code
+                result['headers'] = dict(response.headers)
+                if response.status_code == 304:
+                    # 服务器确认内容未变化，无需下载和解析
+                    result['not_modified'] = True
+                else:
+                    response.raise_for_status()
+                    result['content'] = read_limited(response, max_bytes, deadline)
+        finally:
+            if semaphore:
+                semaphore.release()
+        if result['content'] is not None:
+            result['body_hash'] = hashlib.sha256(result['content']).hexdigest()
+            # 服务器不支持条件请求时，通过内容哈希判断是否变化
+            result['unchanged'] = result['body_hash'] == body_hash
+    except Exception as e:
+        result['error'] = str(e)
+        result['content'] = None
+    result['elapsed'] = time.time() - start
+    return result
+
+# 并发抓取所有RSS源，按完成顺序逐个返回 (website, feed_config, result)
+def fetch_feeds(feeds, fetch_config=None, feed_cache=None, proxies=None, stop_event=None):
+    fetch_config = fetch_config or get_config().get('fetch', {})
+    max_workers = max(1, fetch_config.get('max_workers', 16))
+    per_host = max(1, fetch_config.get('per_host', 4))
+    
+    feed_cache = feed_cache or {}
+    # RSS抓取同样使用代理配置
+    session = get_http_session('feeds', proxies, pool_maxsize=max_workers)
+    host_limits = {}
+    for website, feed_config in feeds:
+        host = urlparse(feed_config.get('rss_url') or '').netloc
+        if host not in host_limits:
+            host_limits[host] = threading.BoundedSemaphore(per_host)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for website, feed_config in feeds:
+            feed_url = feed_config.get('rss_url')
+            options = feed_fetch_options(feed_config, fetch_config)
+            future = executor.submit(fetch_feed, feed_url, host_limits, options['timeout'],
+                                     feed_cache.get(feed_url), session, options['max_bytes'],
+                                     options['total_timeout'])
+            futures[future] = (website, feed_config)
+        cancelled = False
+        try:
+            for future in as_completed(futures):
+                website, feed_config = futures[future]
+                # 收到退出信号后取消尚未开始的抓取，已经开始的抓取完成后照常处理
+                if stop_event is not None and stop_event.is_set() and not cancelled:
+                    for other in futures:
+                        other.cancel()
+                    cancelled = True
+                if future.cancelled():
+                    yield website, feed_config, {'cancelled': True}
+                    continue
+                yield website, feed_config, future.result()
+        except BaseException:
+            # 再次收到信号（KeyboardInterrupt）或调用方中途退出时，取消所有排队中的抓取，
+            # 否则退出with时shutdown(wait=True)会等全部源抓取完
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+# 去重用的规范链接：在normalize_link基础上去掉www前缀，并把镜像站域名映射为原站域名。
+# 锚点同样保留，按链接判重时不区分来源，去掉锚点会把同一源中只靠锚点区分的条目当成重复
+def canonical_link(link, mirror_hosts=None):
+    parsed = urlparse(normalize_link(link))
+    netloc = parsed.netloc
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    netloc = (mirror_hosts or {}).get(netloc, netloc)
+    # 镜像站通常同时提供http和https，协议不参与比较
+    return urlunparse(('', netloc, parsed.path.rstrip('/') or '/', parsed.params, parsed.query, parsed.fragment))
+
+# 提取文本特征：英文单词、数字和单个汉字作为词，相邻两个词组成一个特征；
+# 忽略标点和空格，同一标题在不同镜像中的排版差异不影响结果
+def text_features(text):
+    text = re.sub(r'<[^>]+>', ' ', text or '').lower()
+    tokens = re.findall(r'[a-z0-9]+(?:[-.][a-z0-9]+)*|[\u4e00-\u9fff]', text)
+    if len(tokens) < 2:
+        return tokens
+    return [tokens[i] + ' ' + tokens[i + 1] for i in range(len(tokens) - 1)]
+
+# 标题+摘要的64位SimHash指纹，特征太少时返回None（短文本的指纹不可靠）
+def simhash(title, summary='', min_features=6):
+    # 各镜像的摘要长短不一（全文或节选），只取开头部分，标题权重加倍
+    features = text_features(title) * 2 + text_features((summary or '')[:300])
+    if len(set(features)) < min_features:
+        return None
+    weights = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    # SQLite的INTEGER是有符号64位
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+# 近似重复索引：规范链接完全相同，或SimHash海明距离不超过阈值的文章视为同一篇。
+# 指纹按位分成 max_distance+1 段建立LSH索引，距离不超过阈值的两个指纹至少有一段完全相同
+class DedupIndex:
+    def __init__(self, config):
+        self.max_distance = max(0, config.get('max_distance', 3))
+        self.mirror_hosts = config.get('mirror_hosts') or {}
+        self.bands = self.max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.urls = {}
+        self.buckets = {}
+        self.items = {}
+    
+    # 启动时从最近若干天的文章重建索引
+    @classmethod
+    def load(cls, cursor, config):
+        index = cls(config)
+        cursor.execute(
+            "SELECT id, title, link, source, simhash, dup_of FROM items WHERE timestamp >= datetime('now', ?) ORDER BY id",
+            (f"-{config.get('window_days', 7)} days",)
+        )
+        for item_id, title, link, source, fingerprint, dup_of in cursor.fetchall():
+            index.add(item_id, title, link, source, fingerprint, dup_of)
+        print(f"去重索引已加载 {len(index.items)} 篇文章")
+        return index
+    
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        value = fingerprint & 0xFFFFFFFFFFFFFFFF
+        return [(band, value >> (band * self.band_bits) & mask) for band in range(self.bands)]
+    
+    # 加入索引，重复文章记录其原文id，后续转载都归到同一篇原文下
+    def add(self, item_id, title, link, source, fingerprint, dup_of=None):
+        root = dup_of or item_id
+        self.items[item_id] = (title, source, root, fingerprint)
+        self.urls.setdefault(canonical_link(link, self.mirror_hosts), root)
+        if fingerprint is not None:
+            for key in self._band_keys(fingerprint):
+                self.buckets.setdefault(key, []).append(item_id)
+    
+    # 查找重复的原文，返回 (原文id, 原文标题, 原文来源)；没有重复时返回None
+    def find(self, link, fingerprint, source):
+        root = self.urls.get(canonical_link(link, self.mirror_hosts))
+        if root is None and fingerprint is not None:
+            best = None
+            for key in self._band_keys(fingerprint):
+                for item_id in self.buckets.get(key, ()):
+                    title, item_source, item_root, item_fingerprint = self.items[item_id]
+                    # 同一来源的相似文章多为系列文章（如每日动态），不算重复
+                    if item_source == source:
+                        continue
+                    distance = hamming_distance(fingerprint, item_fingerprint)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, item_root)
+            root = best[1] if best else None
+        if root is None or root not in self.items:
+            return None
+        title, item_source = self.items[root][:2]
+        return root, title, item_source
+
+# 根据配置加载去重索引，未开启时返回None
+def open_dedup_index(cursor, config=None):
+    dedup_config = (config or get_config()).get('dedup', {})
+    if dedup_config.get('switch', 'ON') != 'ON':
+        return None
+    return DedupIndex.load(cursor, dedup_config)
+
+# 摘要转为纯文本并截断，用于全文搜索
+def plain_text(text, limit=1000):
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', text or ''))
+    return re.sub(r'\s+', ' ', text).strip()[:limit]
+
+# 多关键词匹配（Aho-Corasick自动机）：一次扫描文本找出所有出现的关键词，耗时与关键词数量无关
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].add(index)
+        # 按层次遍历建立失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+    
+    # 返回文本中出现的关键词下标集合
+    def search(self, text):
+        found = set()
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+CVE_PATTERN = re.compile(r'CVE-\d{4}-\d{4,7}', re.IGNORECASE)
+# CVSS评分：版本号（v3.1、:3.1）之后隔不超过30个字符的数字，如 "CVSS v3.1 base score 9.8"；
+# 不匹配向量字符串（CVSS:3.1/AV:N/...）中的版本号
+CVSS_PATTERN = re.compile(r'CVSS(?:[\s:]*v?[234](?:\.\d)?)?[^0-9/\n]{0,30}?(?<![\d.])(\d{1,2}(?:\.\d)?)(?!\.?\d|/)',
+                          re.IGNORECASE)
+# 引用编号分组（\1、(?(1)...)）的正则放入合并表达式后分组编号会变化，需单独匹配
+NUMBERED_GROUP_REF = re.compile(r'\\[1-9]|\(\?\(\d')
+
+# 推送规则引擎：所有规则的关键词合并为一个自动机，正则合并为一个表达式用于预筛，
+# 大部分文章不命中任何正则，只需扫描一遍文本；预筛命中后再逐条匹配各规则的正则。
+# 不能合并的正则（全局标志如 (?i)、编号引用、重名分组）单独匹配。
+# 规则按顺序全部评估：命中的 route 规则的渠道取并集；命中 drop 规则的文章不推送；
+# 没有命中任何规则时推送到 default_channels
+class RulesEngine:
+    def __init__(self, rules_config):
+        self.default_channels = rules_config.get('default_channels', 'all')
+        self.rules = []
+        keywords, keyword_rules = [], []
+        patterns = []
+        self.standalone = []
+        self.cve_rules = {}
+        for index, rule in enumerate(rules_config.get('rules') or []):
+            name = rule.get('name') or f'rule-{index}'
+            rule_id = len(self.rules)
+            try:
+                # 先单独编译检查，出错的规则整条跳过
+                compiled = [re.compile(str(pattern), re.IGNORECASE) for pattern in rule.get('regex') or []]
+            except re.error as e:
+                print(f"推送规则 {name} 的正则有误，已跳过: {str(e)}")
+                continue
+            for regex in compiled:
+                if self._combinable(regex.pattern):
+                    patterns.append((rule_id, regex))
+                else:
+                    self.standalone.append((rule_id, regex))
+            for keyword in rule.get('keywords') or []:
+                keywords.append(str(keyword).lower())
+                keyword_rules.append(rule_id)
+            cve = rule.get('cve')
+            if isinstance(cve, (list, tuple)):
+                for cve_id in cve:
+                    self.cve_rules.setdefault(str(cve_id).upper(), set()).add(rule_id)
+            self.rules.append({
+                'name': name,
+                'action': rule.get('action', 'route'),
+                'channels': rule.get('channels', 'all'),
+                'sources': set(rule.get('sources') or []),
+                'exclude_sources': set(rule.get('exclude_sources') or []),
+                'any_cve': cve is True,
+                'min_cvss': rule.get('min_cvss'),
+                'has_matchers': bool(rule.get('keywords') or rule.get('regex') or cve or rule.get('min_cvss') is not None)
+            })
+        self.keyword_rules = keyword_rules
+        self.keywords = KeywordMatcher(keywords) if keywords else None
+        self.patterns = patterns
+        self.regex = None
+        if patterns:
+            try:
+                self.regex = re.compile('|'.join(f'(?:{regex.pattern})' for rule_id, regex in patterns), re.IGNORECASE)
+            except re.error:
+                # 各规则之间分组重名等原因无法合并时，全部单独匹配
+                self.standalone.extend(patterns)
+                self.patterns = []
+    
+    # 正则能否放入合并表达式：不引用编号分组，且包上分组后仍能编译
+    @staticmethod
+    def _combinable(pattern):
+        if NUMBERED_GROUP_REF.search(pattern):
+            return False
+        try:
+            re.compile(f'(?:{pattern})', re.IGNORECASE)
+        except re.error:
+            return False
+        return True
+    
+    # 返回文本命中的规则id集合（不含来源条件）
+    def _content_hits(self, text):
+        hits = set()
+        if self.keywords is not None:
+            hits.update(self.keyword_rules[index] for index in self.keywords.search(text.lower()))
+        # 合并后的正则在同一位置只返回第一个命中的分支且匹配不重叠，只用来判断是否需要逐条匹配，
+        # 否则同一段文本命中的其他规则（包括drop规则）会被漏掉
+        if self.regex is not None and self.regex.search(text):
+            for rule_id, regex in self.patterns:
+                if rule_id not in hits and regex.search(text):
+                    hits.add(rule_id)
+        for rule_id, regex in self.standalone:
+            if rule_id not in hits and regex.search(text):
+                hits.add(rule_id)
+        cves = {cve.upper() for cve in CVE_PATTERN.findall(text)}
+        for cve in cves:
+            hits.update(self.cve_rules.get(cve, ()))
+        scores = [float(score) for score in CVSS_PATTERN.findall(text) if float(score) <= 10]
+        for rule_id, rule in enumerate(self.rules):
+            if rule['any_cve'] and cves:
+                hits.add(rule_id)
+            if rule['min_cvss'] is not None and scores and max(scores) >= float(rule['min_cvss']):
+                hits.add(rule_id)
+        return hits
+    
+    # 计算文章应推送的渠道列表（只保留已开启的渠道），返回 (渠道列表, 命中的规则名称)
+    def route(self, title, summary, source, channels):
+        hits = self._content_hits(f"{title or ''}\n{summary or ''}")
+        matched = []
+        for rule_id, rule in enumerate(self.rules):
+            if rule['has_matchers'] and rule_id not in hits:
+                continue
+            if rule['sources'] and source not in rule['sources']:
+                continue
+            if source in rule['exclude_sources']:
+                continue
+            matched.append(rule)
+        names = [rule['name'] for rule in matched]
+        if any(rule['action'] == 'drop' for rule in matched):
+            return [], names
+        routes = [rule for rule in matched if rule['action'] == 'route']
+        if not routes:
+            return self._resolve(self.default_channels, channels), names
+        selected = set()
+        for rule in routes:
+            selected.update(self._resolve(rule['channels'], channels))
+        return [channel for channel in channels if channel in selected], names
+    
+    @staticmethod
+    def _resolve(targets, channels):
+        if targets == 'all':
+            return list(channels)
+        if isinstance(targets, str):
+            targets = [targets]
+        return [channel for channel in channels if channel in (targets or [])]
+
+# 规则引擎只在配置变化时重新编译；新配置编译失败时继续使用上一次的规则（首次失败则不按规则路由），
+# 不影响各个源的处理
+_rules_cache = {'config': None, 'engine': None}
+
+def get_rules_engine(config=None):
+    rules_config = (config or get_config()).get('rules', {})
+    if rules_config.get('switch', 'OFF') != 'ON':
+        return None
+    if _rules_cache['config'] is not rules_config:
+        try:
+            _rules_cache['engine'] = RulesEngine(rules_config)
+        except Exception as e:
+            print(f"推送规则加载失败，{'继续使用上一次的规则' if _rules_cache['engine'] else '暂不按规则路由'}: {str(e)}")
+        _rules_cache['config'] = rules_config
+    return _rules_cache['engine']
+
+# 链接哈希的前8字节转为有符号64位整数，作为seen_links的主键
+def seen_hash(key):
+    value = int(key[:16], 16)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+# 批量查询已存在的链接哈希，分批避免超过SQLite参数个数限制
+def find_known_links(cursor, hashes, batch_size=500):
+    known = set()
+    for i in range(0, len(hashes), batch_size):
+        batch = hashes[i:i + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f"SELECT link_hash FROM items WHERE link_hash IN ({placeholders})", batch)
+        known.update(row[0] for row in cursor.fetchall())
+    # 已归档的旧文章只在seen_links中保留哈希
+    remaining = {seen_hash(key): key for key in hashes if key not in known}
+    keys = list(remaining)
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f"SELECT hash FROM seen_links WHERE hash IN ({placeholders})", batch)
+        known.update(remaining[row[0]] for row in cursor.fetchall())
+    return known
+
+# 按发布时间从旧到新排序；缺少时间信息时按RSS中的倒序（RSS通常最新的在前）
+def sort_entries_oldest_first(entries):
+    entries = list(reversed(entries))
+    if all(entry.get('published_parsed') or entry.get('updated_parsed') for entry in entries):
+        entries.sort(key=lambda entry: entry.get('published_parsed') or entry.get('updated_parsed'))
+    return entries
+
+# 文章的发布时间（UTC时间戳），没有发布时间时使用更新时间
+def entry_published(entry):
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    return calendar.timegm(parsed) if parsed else None
+
+# 文章作者
+def entry_author(entry):
+    return (entry.get('author') or '').strip()[:100] or None
+
+# 文章标签（分类），去重后用逗号连接
+def entry_tags(entry):
+    tags = []
+    for tag in entry.get('tags') or []:
+        term = (tag.get('term') or '').strip()
+        if term and term not in tags:
+            tags.append(term)
+    return ','.join(tags)[:200] or None
+
+# 源是否有历史记录：成功处理过（有条件请求缓存或成功记录）或已收录过文章。
+# 不能以"本次条目都不在库中"判断，更新很快的源两次轮询之间可能整窗口都是新文章
+def feed_has_history(cursor, feed_url, source):
+    cursor.execute(
+        "SELECT 1 FROM feed_cache WHERE feed_url = ? "
+        "UNION ALL SELECT 1 FROM feed_health WHERE source = ? AND last_success IS NOT NULL "
+        "UNION ALL SELECT 1 FROM items WHERE source = ? LIMIT 1",
+        (feed_url, source, source)
+    )
+    return cursor.fetchone() is not None
+
+# 获取数据并检查更新，返回本次新增的 (标题, 链接) 列表
+def check_for_updates(feed_url, site_name, cursor, conn, send_push=True, fetched=None, source=None, config=None,
+                      dispatcher=None, scheduler=None, claim_store=None, dedup=None):
     print(f"{site_name} 监控中... ")
-    data_list = []
-    file_data = feedparser.parse(feed_url)
-    data = file_data.entries
-    if data:
-        data_title = data[0].get('title')
-        data_link = data[0].get('link')
-        data_list.append(data_title)
-        data_list.append(data_link)
-
-        # 查询数据库中是否存在相同链接的文章
-        cursor.execute("SELECT * FROM items WHERE link = ?", (data_link,))
-        result = cursor.fetchone()
-        if result is None:
-            # 未找到相同链接的文章
-            push_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-            
-            # 只有在send_push为True时才发送推送
-            if send_push:
-                extra_data = {
-                    'link': data_link,
-                    'timestamp': push_time,
-                    'is_article': True
-                }
-                push_message(f"{site_name}今日更新", f"标题: {data_title}\n链接: {data_link}\n推送时间：{push_time}", extra_data=extra_data)
-
-            # 存储到数据库 with a timestamp
-            cursor.execute("INSERT INTO items (title, link, timestamp) VALUES (?, ?, CURRENT_TIMESTAMP)", (data_title, data_link))
+    new_items = []
+    # 未提供抓取结果时（例如单独调用），在当前线程中同步下载
+    if fetched is None:
+        fetched = fetch_feed(feed_url)
+    if fetched.get('error'):
+        print(f"{site_name} 抓取失败: {fetched['error']}")
+        return new_items
+    import feedparser
+    with METRICS.timed('stage_seconds', stage='parse'):
+        file_data = feedparser.parse(fetched['content'], response_headers=fetched.get('headers'))
+    # 返回的不是有效的RSS（例如失效镜像返回的错误页面），计为一次失败
+    if file_data.get('bozo') and not file_data.entries:
+        raise ValueError(f"RSS解析失败: {file_data.get('bozo_exception')}")
+    if scheduler is not None:
+        scheduler.observe(source, file_data)
+    
+    # 同一个源内按规范化链接去重，保留第一次出现的条目
+    entries = {}
+    for entry in file_data.entries:
+        link = entry.get('link')
+        if link:
+            entries.setdefault(link_hash(link), entry)
+    if not entries:
+        return new_items
+    
+    # 一次查询找出所有未收录的文章
+    with METRICS.timed('stage_seconds', stage='db_lookup'):
+        known = find_known_links(cursor, list(entries))
+    new_entries = sort_entries_oldest_first([entry for key, entry in entries.items() if key not in known])
+    if not new_entries:
+        return new_items
+    
+    new_items = [(entry.get('title'), entry.get('link')) for entry in new_entries]
+    summaries = {entry.get('link'): plain_text(entry.get('summary')) or None for entry in new_entries}
+    published = {entry.get('link'): entry_published(entry) for entry in new_entries}
+    metadata = {entry.get('link'): (entry_author(entry), entry_tags(entry)) for entry in new_entries}
+    
+    # 新加入的源没有任何历史记录，只推送最新一篇，避免一次性刷屏
+    push_items = new_items
+    if not known and len(new_items) > 1 and not feed_has_history(cursor, feed_url, source or site_name):
+        print(f"{site_name} 首次收录 {len(new_items)} 篇文章，仅推送最新一篇")
+        push_items = new_items[-1:]
+    
+    # 近似重复检测：与其他来源已收录的文章链接相同或内容相似时，记录原文并按配置不推送或注明原文
+    config = config or get_config()
+    dedup_mode = config.get('dedup', {}).get('mode', 'suppress')
+    fingerprints = {entry.get('link'): simhash(entry.get('title'), entry.get('summary')) for entry in new_entries}
+    duplicates = {}
+    if dedup is not None:
+        with METRICS.timed('stage_seconds', stage='dedup'):
+            for title, link in new_items:
+                match = dedup.find(link, fingerprints[link], source or site_name)
+                if match:
+                    duplicates[link] = match
+        if duplicates:
+            METRICS.inc('articles_duplicate', len(duplicates))
+            print(f"{site_name} 有 {len(duplicates)} 篇文章与其他来源重复")
+            if dedup_mode != 'group':
+                push_items = [(title, link) for title, link in push_items if link not in duplicates]
+    
+    # 多实例运行时先在共享认领库中占用，其他实例已推送过的链接不再推送；
+    # 其他实例占用中尚未确认的链接本轮不写入，下次抓取时再认领（对方退出时租约过期后由本实例接手）
+    claimed = None
+    if send_push and claim_store is not None and push_items:
+        claimed, busy = claim_store.claim([link_hash(link) for title, link in new_items])
+        if busy:
+            new_items = [(title, link) for title, link in new_items if link_hash(link) not in busy]
+            fetched['deferred'] = len(busy)
+            print(f"{site_name} 有 {len(busy)} 篇文章正由其他实例处理，下次抓取时再确认")
+        skipped = len(push_items)
+        push_items = [(title, link) for title, link in push_items if link_hash(link) in claimed]
+        skipped -= len(push_items)
+        if skipped:
+            print(f"{site_name} 有 {skipped} 篇文章已被其他实例推送，跳过")
+    
+    # 按推送规则为每篇文章选择渠道
+    channels = enabled_channels(config.get('push', {}))
+    routes = None
+    engine = get_rules_engine(config) if send_push else None
+    if engine is not None and push_items:
+        routes = {}
+        for title, link in push_items:
+            routes[link], names = engine.route(title, summaries.get(link), source or site_name, channels)
+            for name in names:
+                METRICS.inc('rule_matches', rule=name)
+        filtered = [item for item in push_items if not routes[item[1]]]
+        if filtered:
+            print(f"{site_name} 有 {len(filtered)} 篇文章按推送规则不推送")
+    
+    # 存储到数据库 with a timestamp；文章和对应的待推送记录在同一个事务中写入，
+    # 进程中途退出也不会丢失推送
+    with METRICS.timed('stage_seconds', stage='db_insert'), conn:
+        last_id = cursor.execute("SELECT IFNULL(MAX(id), 0) FROM items").fetchone()[0]
+        cursor.executemany(
+            "INSERT OR IGNORE INTO items (title, link, link_hash, source, summary, simhash, dup_of, published, author, "
+            "tags, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            [(title, link, link_hash(link), source or site_name, pack_summary(summaries[link]), fingerprints[link],
+              duplicates[link][0] if link in duplicates else None, published[link], *metadata[link])
+             for title, link in new_items]
+        )
+        index_items(cursor, {link_hash(link): summaries[link] for title, link in new_items}, last_id)
+        # 只有在send_push为True时才发送推送，按从旧到新的顺序
+        if send_push:
+            enqueue_outbox(cursor, site_name, push_items, channels,
+                           similar=duplicates if dedup_mode == 'group' else None, routes=routes,
+                           published=published)
+    # 文章和发件箱已在本地提交，确认认领
+    if claimed:
+        claim_store.confirm(claimed)
+    METRICS.inc('articles_new', len(new_items), source=source or site_name)
+    
+    # 新文章加入去重索引，本轮后续处理的源也能识别到
+    if dedup is not None:
+        titles = {link: title for title, link in new_items}
+        hashes = {link_hash(link): link for title, link in new_items}
+        keys = list(hashes)
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            cursor.execute(f"SELECT id, link_hash FROM items WHERE link_hash IN ({','.join('?' * len(batch))})", batch)
+            for item_id, key in cursor.fetchall():
+                link = hashes[key]
+                dup_of = duplicates[link][0] if link in duplicates else None
+                dedup.add(item_id, titles[link], link, source or site_name, fingerprints[link], dup_of)
+    
+    if send_push:
+        drain_outbox(conn, config, dispatcher)
+    return new_items
+
+# 运行指标：记录各热点路径的耗时和计数，推送线程和主线程都会写入，需加锁
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+        self.gauges = {}
+        self.started_at = time.time()
+    
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+    
+    # 记录一次耗时：[次数, 总耗时, 最大耗时]
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+    
+    @contextmanager
+    def timed(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    # 各阶段累计耗时的快照，用于计算单轮的耗时分布
+    def stage_totals(self):
+        totals = {}
+        with self.lock:
+            for (name, labels), (count, total, _) in self.timings.items():
+                if name != 'stage_seconds':
+                    continue
+                labels = dict(labels)
+                stage = labels.pop('stage', '')
+                # 推送按渠道区分，例如 push:dingding
+                stage = ':'.join([stage] + [str(value) for _, value in sorted(labels.items())])
+                totals[stage] = [count, total]
+        return totals
+    
+    # 输出Prometheus文本格式
+    def render_prometheus(self):
+        def fmt_labels(labels):
+            if not labels:
+                return ''
+            pairs = ','.join(
+                '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                for k, v in labels
+            )
+            return '{' + pairs + '}'
+        
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            timings = sorted(self.timings.items())
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f'rss_monitor_{name}_total'
+            if metric not in declared:
+                lines.append(f'# TYPE {metric} counter')
+                declared.add(metric)
+            lines.append(f'{metric}{fmt_labels(labels)} {value}')
+        for (name, labels), value in gauges:
+            metric = f'rss_monitor_{name}'
+            if metric not in declared:
+                lines.append(f'# TYPE {metric} gauge')
+                declared.add(metric)
+            lines.append(f'{metric}{fmt_labels(labels)} {value}')
+        for (name, labels), (count, total, peak) in timings:
+            metric = f'rss_monitor_{name}'
+            if metric not in declared:
+                lines.append(f'# TYPE {metric} summary')
+                declared.add(metric)
+            lines.append(f'{metric}_count{fmt_labels(labels)} {count}')
+            lines.append(f'{metric}_sum{fmt_labels(labels)} {total:.6f}')
+            lines.append(f'{metric}_max{fmt_labels(labels)} {peak:.6f}')
+        lines.append('# TYPE rss_monitor_uptime_seconds gauge')
+        lines.append(f'rss_monitor_uptime_seconds {time.time() - self.started_at:.1f}')
+        return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+
+# 在后台线程中启动指标接口
+def start_metrics_server(config=None):
+    metrics_config = (config or get_config()).get('metrics', {})
+    if metrics_config.get('switch', 'OFF') != 'ON':
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = METRICS.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        # 不在控制台输出每次抓取指标的访问日志
+        def log_message(self, format, *args):
+            pass
+    
+    try:
+        server = ThreadingHTTPServer((metrics_config.get('host', '127.0.0.1'), metrics_config.get('port', 9108)),
+                                     MetricsHandler)
+    except OSError as e:
+        print(f"指标接口启动失败: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    print(f"指标接口已启动：http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
+
+# 输出单轮的JSON汇总：各阶段耗时（相对本轮开始时的增量）、计数和最慢的源
+def print_cycle_summary(stats, stage_start, elapsed, slowest):
+    stages = {}
+    for stage, (count, total) in METRICS.stage_totals().items():
+        prev_count, prev_total = stage_start.get(stage, [0, 0.0])
+        if count > prev_count:
+            stages[stage] = {'count': count - prev_count, 'seconds': round(total - prev_total, 3)}
+    summary = {
+        'event': 'cycle',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
+        'elapsed': round(elapsed, 3),
+        'stats': stats,
+        'stages': stages,
+        'slowest': [{'source': source, 'seconds': round(seconds, 3)} for seconds, source in slowest]
+    }
+    print(json.dumps(summary, ensure_ascii=False))
+
+# 读取所有RSS源的健康状态 {source: {...}}
+def load_feed_health(cursor):
+    cursor.execute("SELECT source, state, consecutive_failures, open_until, avg_latency, avg_bytes FROM feed_health")
+    return {
+        row[0]: {'state': row[1], 'consecutive_failures': row[2], 'open_until': row[3],
+                 'avg_latency': row[4], 'avg_bytes': row[5]}
+        for row in cursor.fetchall()
+    }
+
+# 熔断检查：处于熔断状态且未到探测时间的源本轮跳过；到期后放行一次作为半开探测
+def filter_open_circuits(feeds, health, now=None):
+    now = time.time() if now is None else now
+    allowed, skipped = [], []
+    for website, feed_config in feeds:
+        state = health.get(website)
+        if state and state['state'] == 'open':
+            if state['open_until'] and now < state['open_until']:
+                skipped.append(website)
+                continue
+            print(f"{feed_config.get('website_name')} 熔断到期，进行半开探测")
+        allowed.append((website, feed_config))
+    return allowed, skipped
+
+# 记录一次抓取结果，更新平均耗时/大小（指数移动平均）并维护熔断状态
+def record_feed_health(cursor, website, feed_url, result, success, breaker_config, health=None, now=None):
+    now = time.time() if now is None else now
+    previous = (health or {}).get(website) or {}
+    alpha = 0.3
+    latency = result.get('elapsed') or 0.0
+    avg_latency = latency if previous.get('avg_latency') is None else (1 - alpha) * previous['avg_latency'] + alpha * latency
+    avg_bytes = previous.get('avg_bytes')
+    if result.get('content') is not None:
+        size = len(result['content'])
+        avg_bytes = size if avg_bytes is None else (1 - alpha) * avg_bytes + alpha * size
+    
+    if success:
+        failures, state, open_until = 0, 'closed', None
+    else:
+        failures = previous.get('consecutive_failures', 0) + 1
+        state, open_until = 'closed', None
+        threshold = breaker_config.get('failure_threshold', 3)
+        if failures >= threshold:
+            backoff = min(breaker_config.get('max_backoff', 7 * 86400),
+                          breaker_config.get('base_backoff', 3600) * 2 ** (failures - threshold))
+            state, open_until = 'open', now + backoff
+            print(f"{website} 连续失败 {failures} 次，熔断 {backoff / 3600:.1f} 小时")
+    
+    cursor.execute(
+        '''INSERT INTO feed_health (source, feed_url, state, consecutive_failures, open_until, last_success, last_failure,
+                                   last_status, last_error, avg_latency, avg_bytes, total_checks)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+           ON CONFLICT(source) DO UPDATE SET
+               feed_url = excluded.feed_url,
+               state = excluded.state,
+               consecutive_failures = excluded.consecutive_failures,
+               open_until = excluded.open_until,
+               last_success = COALESCE(excluded.last_success, last_success),
+               last_failure = COALESCE(excluded.last_failure, last_failure),
+               last_status = excluded.last_status,
+               last_error = excluded.last_error,
+               avg_latency = excluded.avg_latency,
+               avg_bytes = excluded.avg_bytes,
+               total_checks = total_checks + 1''',
+        (website, feed_url, state, failures, open_until, now if success else None, None if success else now,
+         result.get('status'), None if success else result.get('error'), avg_latency, avg_bytes)
+    )
+
+# 格式化时间戳，用于状态表输出
+def format_ts(ts, fmt='%Y-%m-%d %H:%M'):
+    return time.strftime(fmt, time.localtime(ts)) if ts else '-'
+
+# 打印RSS源健康状态表，便于清理失效的源
+def print_feed_status(cursor, rss_config=None):
+    cursor.execute(
+        '''SELECT source, state, consecutive_failures, open_until, last_success, last_status, avg_latency, avg_bytes,
+                  total_checks, last_error
+           FROM feed_health ORDER BY consecutive_failures DESC, source'''
+    )
+    rows = cursor.fetchall()
+    known = {row[0] for row in rows}
+    print(f"{'状态':<6} {'连续失败':>8} {'状态码':>6} {'平均耗时':>8} {'平均大小':>10} {'检查次数':>8}  {'最后成功':<16}  {'熔断至':<16}  源 / 错误")
+    for source, state, failures, open_until, last_success, last_status, avg_latency, avg_bytes, total_checks, last_error in rows:
+        state_text = {'closed': '正常', 'open': '熔断'}.get(state, state)
+        if state == 'closed' and failures:
+            state_text = '失败'
+        latency_text = f"{avg_latency:.2f}s" if avg_latency is not None else '-'
+        bytes_text = f"{avg_bytes / 1024:.1f}KB" if avg_bytes is not None else '-'
+        print(f"{state_text:<6} {failures:>8} {last_status or '-':>6} {latency_text:>8} {bytes_text:>10} {total_checks:>8}  "
+              f"{format_ts(last_success):<16}  {format_ts(open_until) if state == 'open' else '-':<16}  {source}"
+              + (f" / {last_error[:80]}" if last_error else ''))
+    # rss.yaml中已配置但还没有任何抓取记录的源
+    for source in (rss_config or {}):
+        if source not in known:
+            print(f"{'未检查':<6} {'-':>8} {'-':>6} {'-':>8} {'-':>10} {0:>8}  {'-':<16}  {'-':<16}  {source}")
+    if rss_config is not None:
+        removed = known - set(rss_config)
+        if removed:
+            print(f"以下源已不在rss.yaml中：{', '.join(sorted(removed))}")
+
+# CSV导入时识别的表头（不区分大小写），没有表头时取每行第一个链接为地址、第一个非链接为名称
+CSV_NAME_COLUMNS = ('website_name', 'name', 'title', 'text', '名称', '网站名称')
+CSV_URL_COLUMNS = ('rss_url', 'xmlurl', 'feed_url', 'feed', 'url', 'rss', 'rss链接')
+
+# 从OPML读取RSS源 [(名称, 地址)]，分组（嵌套的outline）展开
+def parse_opml(content):
+    import xml.etree.ElementTree as ET
+    root = ET.fromstring(content)
+    feeds = []
+    for outline in root.iter('outline'):
+        url = outline.get('xmlUrl') or outline.get('xmlurl')
+        if url and url.strip():
+            feeds.append((outline.get('title') or outline.get('text'), url.strip()))
+    return feeds
+
+# 从CSV读取RSS源 [(名称, 地址)]
+def parse_feed_csv(content):
+    import csv
+    rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(content))]
+    rows = [row for row in rows if any(row) and not row[0].startswith('#')]
+    name_col = url_col = None
+    if rows and not any('://' in cell for cell in rows[0]):
+        header = [cell.lower() for cell in rows.pop(0)]
+        url_col = next((header.index(name) for name in CSV_URL_COLUMNS if name in header), None)
+        name_col = next((header.index(name) for name in CSV_NAME_COLUMNS if name in header), None)
+    feeds = []
+    for row in rows:
+        if url_col is not None:
+            url = row[url_col] if url_col < len(row) else ''
+            name = row[name_col] if name_col is not None and name_col < len(row) else None
+        else:
+            url = next((cell for cell in row if '://' in cell), '')
+            name = next((cell for cell in row if cell and '://' not in cell), None)
+        if url:
+            feeds.append((name or None, url))
+    return feeds
+
+# 按扩展名或内容识别OPML/CSV并读取RSS源列表
+def load_feed_list(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+    if path.lower().endswith(('.opml', '.xml')) or content.lstrip().startswith('<'):
+        return parse_opml(content)
+    return parse_feed_csv(content)
+
+# 并发验证RSS源：复用抓取流程下载，解析后识别格式、文章数和响应耗时，返回 {地址: 验证结果}
+def validate_feeds(urls, config=None):
+    import feedparser
+    from feedparser.api import SUPPORTED_VERSIONS
+    config = config or get_config()
+    reports = {}
+    feeds = [(url, {'rss_url': url}) for url in urls]
+    for url, feed_config, result in fetch_feeds(feeds, config.get('fetch'), None, get_proxies(config)):
+        report = {'status': result.get('status'), 'latency': result.get('elapsed', 0.0), 'format': None,
+                  'entries': 0, 'title': None, 'error': result.get('error')}
+        if not report['error']:
+            file_data = feedparser.parse(result['content'], response_headers=result.get('headers'))
+            if file_data.get('version'):
+                report['format'] = SUPPORTED_VERSIONS.get(file_data.version, file_data.version)
+                report['entries'] = len(file_data.entries)
+                report['title'] = file_data.feed.get('title')
+            else:
+                report['error'] = f"不是有效的RSS/Atom: {file_data.get('bozo_exception') or '无法识别格式'}"
+        reports[url] = report
+    return reports
+
+# 将新的RSS源追加到rss.yaml末尾（保留原有内容和注释），写入临时文件后替换，中途失败不会损坏配置
+def append_rss_config(feeds, path='rss.yaml'):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except FileNotFoundError:
+        content = ''
+    if content and not content.endswith('\n'):
+        content += '\n'
+    content += yaml.safe_dump(dict(feeds), allow_unicode=True, default_flow_style=False, sort_keys=False,
+                              default_style='"', width=1000)
+    write_file_atomic(path, content)
+
+# 与已有名称冲突时加上序号，如 "某个源 (2)"，避免rss.yaml中出现重复的键
+def unique_feed_name(base, *taken):
+    name, index = base, 2
+    while any(name in names for names in taken):
+        name, index = f"{base} ({index})", index + 1
+    return name
+
+# 批量导入RSS源：按规范化地址去重（忽略协议、www和跟踪参数），并发验证后只追加有效的源
+def import_feeds(path, config=None, dry_run=False):
+    feeds = load_feed_list(path)
+    rss_config = load_rss_config()
+    known = {canonical_link(feed.get('rss_url')) for feed in rss_config.values() if feed.get('rss_url')}
+    candidates = {}
+    for name, url in feeds:
+        key = canonical_link(url)
+        if key not in known:
+            known.add(key)
+            candidates[url] = name
+    print(f"读取到 {len(feeds)} 个RSS源，{len(feeds) - len(candidates)} 个与rss.yaml或文件中已有的源重复，"
+          f"开始验证 {len(candidates)} 个...")
+    
+    start = time.time()
+    reports = validate_feeds(list(candidates), config)
+    added = {}
+    failed = []
+    formats = {}
+    for url, name in candidates.items():
+        report = reports[url]
+        if report['error']:
+            failed.append((url, report))
+            continue
+        formats[report['format']] = formats.get(report['format'], 0) + 1
+        # 文件中没有名称时使用RSS源自身的标题，与已有名称冲突时加上序号
+        name = unique_feed_name(name or report['title'] or urlparse(url).netloc, rss_config, added)
+        added[name] = {'rss_url': url, 'website_name': name}
+    
+    for url, report in failed:
+        print(f"验证失败 {report['status'] or '-':>4} {report['latency']:>6.2f}s  {url}  {report['error'][:120]}")
+    latencies = sorted(report['latency'] for report in reports.values() if not report['error'])
+    if latencies:
+        print(f"响应耗时：中位数 {latencies[len(latencies) // 2]:.2f}s，最慢 {latencies[-1]:.2f}s；格式："
+              + ', '.join(f"{name} {count}" for name, count in sorted(formats.items(), key=lambda item: -item[1])))
+    print(f"验证完成，耗时 {time.time() - start:.1f} 秒：有效 {len(added)} 个，失败 {len(failed)} 个")
+    if added and not dry_run:
+        append_rss_config(added)
+        print(f"已将 {len(added)} 个RSS源追加到rss.yaml")
+    return added, failed
+
+# 导出RSS源为OPML，附带健康状态（熔断状态、连续失败、平均耗时等）作为outline的扩展属性
+def export_opml(path, cursor, rss_config):
+    import xml.etree.ElementTree as ET
+    from email.utils import formatdate
+    cursor.execute(
+        '''SELECT source, state, consecutive_failures, last_success, last_status, avg_latency, avg_bytes, total_checks,
+                  last_error
+           FROM feed_health'''
+    )
+    health = {row[0]: row[1:] for row in cursor.fetchall()}
+    root = ET.Element('opml', version='2.0')
+    head = ET.SubElement(root, 'head')
+    ET.SubElement(head, 'title').text = '安全社区文章监控 RSS源'
+    ET.SubElement(head, 'dateCreated').text = formatdate(localtime=True)
+    body = ET.SubElement(root, 'body')
+    for source, feed_config in rss_config.items():
+        name = feed_config.get('website_name') or source
+        outline = ET.SubElement(body, 'outline', type='rss', text=name, title=name,
+                                xmlUrl=feed_config.get('rss_url') or '')
+        if source in health:
+            state, failures, last_success, last_status, avg_latency, avg_bytes, total_checks, last_error = health[source]
+            attrs = {
+                'monitorState': state,
+                'consecutiveFailures': failures,
+                'totalChecks': total_checks,
+                'lastStatus': last_status,
+                'avgLatency': None if avg_latency is None else f'{avg_latency:.3f}',
+                'avgBytes': None if avg_bytes is None else round(avg_bytes),
+                'lastSuccess': formatdate(last_success, localtime=True) if last_success else None,
+                'lastError': (last_error or '')[:200] or None,
+            }
+            for key, value in attrs.items():
+                if value is not None:
+                    outline.set(key, str(value))
+    ET.indent(root)
+    write_file_atomic(path, ET.tostring(root, encoding='utf-8', xml_declaration=True) + b'\n')
+    print(f"已导出 {len(rss_config)} 个RSS源到 {path}")
+
+# 执行一轮监控：抓取并发进行，解析和数据库写入只在当前（主）线程中完成
+def run_cycle(rss_config, cursor, conn, send_push=True, config=None, dispatcher=None, scheduler=None,
+              claim_store=None, dedup=None, stop_event=None):
+    config = config or get_config()
+    breaker_config = config.get('circuit_breaker', {})
+    stats = {'fetched': 0, 'not_modified': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'new': 0, 'tripped': 0,
+             'cancelled': 0}
+    start = time.time()
+    stage_start = METRICS.stage_totals()
+    fetch_times = []
+    # 处于熔断状态的源本轮不抓取
+    health = load_feed_health(cursor)
+    feeds, tripped = filter_open_circuits(list(rss_config.items()), health, start)
+    stats['tripped'] = len(tripped)
+    if scheduler is not None:
+        for website in tripped:
+            scheduler.complete(website, False)
+    # 先重试上一轮或上次运行中未送达的推送
+    if send_push:
+        drain_outbox(conn, config, dispatcher)
+        # 规则引擎在处理各源之前编译，配置有误时只提示一次
+        get_rules_engine(config)
+    for website, feed_config, result in fetch_feeds(feeds, config.get('fetch'), load_feed_cache(cursor),
+                                                    get_proxies(config), stop_event):
+        # 因退出而取消的源不记录健康状态和调度结果，下次运行时重新抓取
+        if result.get('cancelled'):
+            stats['cancelled'] += 1
+            continue
+        site_name = feed_config.get("website_name")
+        success = False
+        # 抓取在线程池中进行，耗时由fetch_feed记录
+        METRICS.observe('stage_seconds', result.get('elapsed', 0.0), stage='fetch')
+        METRICS.observe('feed_fetch_seconds', result.get('elapsed', 0.0), source=website)
+        fetch_times.append((result.get('elapsed', 0.0), website))
+        if result.get('content') is not None:
+            METRICS.inc('fetch_bytes', len(result['content']))
+        if result.get('error'):
+            stats['failed'] += 1
+            print(f"{site_name} 抓取失败: {result['error']}")
+        elif result.get('not_modified'):
+            stats['not_modified'] += 1
+            success = True
+        elif result.get('unchanged'):
+            stats['bytes'] += len(result['content'])
+            stats['skipped'] += 1
+            success = True
+            # 内容虽未变化，但服务器可能返回了新的ETag，仍需刷新缓存
+            save_feed_cache(cursor, result)
             conn.commit()
-    return data_list
+        else:
+            stats['bytes'] += len(result['content'])
+            stats['fetched'] += 1
+            try:
+                new_items = check_for_updates(feed_config.get("rss_url"), site_name, cursor, conn,
+                                              send_push=send_push, fetched=result, source=website, config=config,
+                                              dispatcher=dispatcher, scheduler=scheduler, claim_store=claim_store,
+                                              dedup=dedup)
+                stats['new'] += len(new_items)
+                # 处理成功后才更新缓存，失败的源下一轮会重新解析；
+                # 有文章正由其他实例处理时也不更新，保证下一轮重新下载并认领
+                if not result.get('deferred'):
+                    save_feed_cache(cursor, result)
+                conn.commit()
+                success = True
+            except Exception as e:
+                stats['failed'] += 1
+                result['error'] = str(e)
+                print(f"{site_name} 处理失败: {str(e)}")
+        record_feed_health(cursor, website, feed_config.get('rss_url'), result, success, breaker_config, health)
+        conn.commit()
+        METRICS.inc('feed_checks', result='ok' if success else 'failed')
+        if scheduler is not None:
+            scheduler.complete(website, success)
+    print(f"本轮共检查 {len(feeds)} 个RSS源，耗时 {time.time() - start:.1f} 秒："
+          f"解析 {stats['fetched']} 个，未修改(304) {stats['not_modified']} 个，"
+          f"内容未变跳过 {stats['skipped']} 个，失败 {stats['failed']} 个，熔断跳过 {stats['tripped']} 个，"
+          f"新增文章 {stats['new']} 篇，下载 {stats['bytes'] / 1024:.1f} KB")
+    if stats['cancelled']:
+        print(f"收到退出信号，取消了 {stats['cancelled']} 个尚未开始的抓取")
+    elapsed = time.time() - start
+    METRICS.observe('cycle_seconds', elapsed)
+    METRICS.set('feeds_tripped', stats['tripped'])
+    METRICS.set('last_cycle_timestamp', round(time.time()))
+    if config.get('metrics', {}).get('summary', 'ON') == 'ON':
+        print_cycle_summary(stats, stage_start, elapsed, sorted(fetch_times, reverse=True)[:5])
+    return stats
+
+# 推送渠道客户端注册表：每个渠道复用一个长连接Session，钉钉/Telegram客户端也在进程内复用
+_channel_clients = {}
+_channel_clients_lock = threading.Lock()
+
+def _proxies_key(proxies):
+    return tuple(sorted((proxies or {}).items()))
+
+# 获取渠道专用的keep-alive Session，按渠道和代理配置分别缓存，首次使用时才创建
+def get_http_session(channel, proxies=None, pool_maxsize=10):
+    key = ('session', channel, _proxies_key(proxies))
+    with _channel_clients_lock:
+        session = _channel_clients.get(key)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max(10, pool_maxsize), pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if proxies:
+                session.proxies.update(proxies)
+            _channel_clients[key] = session
+        return session
+
+# 复用长连接的钉钉机器人，签名生成和定时刷新沿用 DingtalkChatbot 的实现。
+# 基类来自 dingtalkchatbot，开启钉钉推送后首次发送时才定义
+_pooled_dingtalk_class = None
+
+def get_pooled_dingtalk_class():
+    global _pooled_dingtalk_class
+    if _pooled_dingtalk_class is not None:
+        return _pooled_dingtalk_class
+    import dingtalkchatbot.chatbot as cb
+    
+    class PooledDingtalkChatbot(cb.DingtalkChatbot):
+        def __init__(self, webhook, secret=None, session=None):
+            super().__init__(webhook, secret=secret)
+            self.session = session or get_http_session('dingding')
+            # DingtalkChatbot 默认带 Connection: close，这里去掉以保持长连接
+            self.headers = {'Content-Type': 'application/json; charset=utf-8'}
+        
+        def post(self, data):
+            now = time.time()
+            # 加签时间戳与请求时间不能超过1小时，超时后刷新签名
+            if now - self.start_time >= 3600 and self.secret is not None and self.secret.startswith('SEC'):
+                self.start_time = now
+                self.update_webhook()
+            response = self.session.post(self.webhook, headers=self.headers, data=json.dumps(data), timeout=10)
+            response.raise_for_status()
+            return response.json()
+    
+    _pooled_dingtalk_class = PooledDingtalkChatbot
+    return _pooled_dingtalk_class
+
+# 获取复用的钉钉机器人客户端
+def get_dingtalk_client(webhook, secret_key):
+    key = ('dingding', webhook, secret_key)
+    with _channel_clients_lock:
+        client = _channel_clients.get(key)
+    if client is None:
+        client = get_pooled_dingtalk_class()(webhook, secret=secret_key, session=get_http_session('dingding'))
+        with _channel_clients_lock:
+            client = _channel_clients.setdefault(key, client)
+    return client
+
+# 获取复用的Telegram Bot客户端
+def get_telegram_bot(token, proxies=None, api_url=None):
+    key = ('tg_bot', token, _proxies_key(proxies), api_url)
+    with _channel_clients_lock:
+        bot = _channel_clients.get(key)
+    if bot is None:
+        import telegram
+        kwargs = {'base_url': api_url} if api_url else {}
+        if proxies:
+            # 配置telegram bot使用代理
+            bot = telegram.Bot(token=token, request_kwargs={'proxies': proxies}, **kwargs)
+        else:
+            bot = telegram.Bot(token=token, **kwargs)
+        with _channel_clients_lock:
+            bot = _channel_clients.setdefault(key, bot)
+    return bot
 
 # 获取代理配置
 
-def get_proxies():
-    config = load_config()
+def get_proxies(config=None):
+    config = config or get_config()
     proxy_config = config.get('proxy', {})
     
     if proxy_config.get('enable', 'OFF') == 'OFF':
@@ -169,59 +2138,348 @@ def get_proxies():
     
     return proxies if proxies else None
 
-# 推送函数
-def push_message(title, content, extra_data=None):
-    config = load_config()
-    push_config = config.get('push', {})
+# 获取开启了普通消息推送的渠道
+def enabled_channels(push_config):
+    channels = []
+    for name in ('dingding', 'feishu', 'tg_bot', 'discard'):
+        service = push_config.get(name, {})
+        if service.get('switch', '') != "ON":
+            continue
+        if name == 'discard' and service.get('send_normal_msg', '') != "ON":
+            continue
+        channels.append(name)
+    return channels
+
+# 将多篇文章合并为一条摘要消息
+def build_digest(messages):
+    title = f"今日更新 {len(messages)} 篇文章"
+    content = '\n\n'.join(f"【{message['title']}】\n{message['content']}" for message in messages)
+    return title, content
+
+# 向单个渠道发送一条消息，或将多篇文章合并后发送，返回是否成功
+def send_to_channel(channel, push_config, messages, proxies=None):
+    service = push_config.get(channel, {})
+    if len(messages) == 1:
+        title, content = messages[0]['title'], messages[0]['content']
+    else:
+        title, content = build_digest(messages)
+    
+    if channel == 'dingding':
+        return dingding(title, content, service.get('webhook'), service.get('secret_key'))
+    if channel == 'feishu':
+        return feishu(title, content, service.get('webhook'))
+    if channel == 'tg_bot':
+        return tgbot(title, content, service.get('token'), service.get('group_id'), proxies=proxies,
+                     api_url=service.get('api_url'))
+    if channel == 'discard':
+        if len(messages) == 1:
+            return send_discard_msg(service.get('webhook'), title, content,
+                                    extra_data=messages[0].get('extra_data'), proxies=proxies)
+        return send_discard_batch(service.get('webhook'), messages, proxies=proxies)
+    print(f"未知推送渠道: {channel}")
+    return False
+
+# 推送函数：有分发队列时交给后台线程发送，否则直接发送
+def push_message(title, content, extra_data=None, config=None, dispatcher=None):
+    config = config or get_config()
+    message = {'title': title, 'content': content, 'extra_data': extra_data}
+    if dispatcher is not None:
+        dispatcher.submit(message)
+        return
     
-    # 钉钉推送
-    if 'dingding' in push_config and push_config['dingding'].get('switch', '') == "ON":
-        send_dingding_msg(push_config['dingding'].get('webhook'), push_config['dingding'].get('secret_key'), title,
-                          content)
+    push_config = config.get('push', {})
+    proxies = get_proxies(config)
+    for channel in enabled_channels(push_config):
+        send_to_channel(channel, push_config, [message], proxies=proxies)
+
+# 滑动窗口限流器，只在所属渠道的工作线程中使用
+class RateLimiter:
+    def __init__(self, max_calls, period=60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()
+
+    def wait(self):
+        if not self.max_calls or self.max_calls <= 0:
+            return
+        now = time.monotonic()
+        while self.calls and now - self.calls[0] >= self.period:
+            self.calls.popleft()
+        if len(self.calls) >= self.max_calls:
+            delay = self.period - (now - self.calls[0])
+            print(f"推送频率已达限制，等待 {delay:.1f} 秒")
+            time.sleep(delay)
+            self.calls.popleft()
+        self.calls.append(time.monotonic())
+
+# 推送分发队列：每个渠道一个后台工作线程，按渠道限流并合并短时间内到达的多篇文章
+class PushDispatcher:
+    _STOP = object()
+
+    def __init__(self, config):
+        self.config = config
+        dispatch_config = config.get('dispatch', {})
+        self.batch_size = max(1, dispatch_config.get('batch_size', 10))
+        self.batch_window = dispatch_config.get('batch_window', 2)
+        self.rate_limits = dispatch_config.get('rate_limits', DEFAULT_RATE_LIMITS)
+        self.queues = {}
+        self.workers = {}
+        self.lock = threading.Lock()
+        # 发件箱消息的投递结果 (outbox_id, 是否成功, 错误信息, 完成时间)，由主线程读取后写回数据库
+        self.results = queue.Queue()
+        # 已交给工作线程、尚未返回结果的发件箱记录，只在主线程中读写
+        self.inflight = set()
+        self.started_at = time.time()
+
+    # 配置热加载后，新消息使用新的推送配置
+    def update_config(self, config):
+        self.config = config
 
-    # 飞书推送
-    if 'feishu' in push_config and push_config['feishu'].get('switch', '') == "ON":
-        send_feishu_msg(push_config['feishu'].get('webhook'), title, content)
+    # 将消息放入所有开启渠道的队列，立即返回
+    def submit(self, message, channels=None):
+        if channels is None:
+            channels = enabled_channels(self.config.get('push', {}))
+        for channel in channels:
+            self._queue_for(channel).put(message)
 
-    # Telegram Bot推送
-    if 'tg_bot' in push_config and push_config['tg_bot'].get('switch', '') == "ON":
-        send_tg_bot_msg(push_config['tg_bot'].get('token'), push_config['tg_bot'].get('group_id'), title, content)
+    def _queue_for(self, channel):
+        with self.lock:
+            if channel not in self.queues:
+                self.queues[channel] = queue.Queue()
+                worker = threading.Thread(target=self._run, args=(channel,), name=f"push-{channel}", daemon=True)
+                self.workers[channel] = worker
+                worker.start()
+            return self.queues[channel]
+
+    # 取出一批消息：拿到第一条后，在batch_window内继续收集，最多batch_size条
+    def _next_batch(self, channel_queue):
+        first = channel_queue.get()
+        if first is self._STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                message = channel_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if message is self._STOP:
+                return batch, True
+            batch.append(message)
+        return batch, False
+
+    def _run(self, channel):
+        channel_queue = self.queues[channel]
+        limiter = RateLimiter(self.rate_limits.get(channel, 0))
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch(channel_queue)
+            # 文章消息合并发送，其他消息（如启动通知）单独发送
+            articles = [message for message in batch if (message.get('extra_data') or {}).get('is_article')]
+            others = [message for message in batch if message not in articles]
+            groups = [[message] for message in others] + ([articles] if articles else [])
+            for group in groups:
+                limiter.wait()
+                error = None
+                try:
+                    push_config = self.config.get('push', {})
+                    with METRICS.timed('stage_seconds', stage='push', channel=channel):
+                        success = send_to_channel(channel, push_config, group, proxies=get_proxies(self.config))
+                    if not success:
+                        error = '推送失败'
+                except Exception as e:
+                    success = False
+                    error = str(e)
+                    print(f"{channel} 推送线程异常: {error}")
+                METRICS.inc('push_messages', len(group), channel=channel, result='ok' if success else 'failed')
+                for message in group:
+                    if message.get('outbox_id') is not None:
+                        self.results.put((message['outbox_id'], success, error, time.time()))
+
+    # 停止接收新消息，等待所有渠道队列发送完毕
+    def close(self, timeout=None):
+        with self.lock:
+            workers = list(self.workers.items())
+        for channel, worker in workers:
+            self.queues[channel].put(self._STOP)
+        # 超时时间是所有渠道共用的总等待时间
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for channel, worker in workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+# 为新文章写入待推送记录，每个开启的渠道一条（需在写入文章的同一事务中调用）
+def enqueue_outbox(cursor, site_name, push_items, channels, similar=None, routes=None, published=None):
+    now = time.time()
+    rows = []
+    for data_title, data_link in push_items:
+        push_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+        extra_data = {
+            'link': data_link,
+            'timestamp': push_time,
+            'is_article': True
+        }
+        content = f"标题: {data_title}\n链接: {data_link}\n推送时间：{push_time}"
+        # RSS中提供了发布时间时一并推送
+        if published and published.get(data_link):
+            extra_data['published'] = format_ts(published[data_link], '%Y-%m-%d %H:%M:%S')
+            content += f"\n发布时间：{extra_data['published']}"
+        # 转载文章注明已推送过的原文
+        if similar and data_link in similar:
+            original_title, original_source = similar[data_link][1:]
+            extra_data['similar_to'] = f"{original_source}《{original_title}》"
+            content += f"\n相似文章：{extra_data['similar_to']}"
+        extra_data = json.dumps(extra_data, ensure_ascii=False)
+        # 有推送规则时按规则选出的渠道推送
+        for channel in (routes.get(data_link, channels) if routes is not None else channels):
+            rows.append((channel, f"{site_name}今日更新", content, extra_data, now, now, link_hash(data_link)))
+    cursor.executemany(
+        "INSERT INTO outbox (item_id, channel, title, content, extra_data, created_at, next_attempt_at) "
+        "SELECT id, ?, ?, ?, ?, ?, ? FROM items WHERE link_hash = ?",
+        rows
+    )
+
+# 计算下一次重试的等待时间：指数退避 + 随机抖动
+def outbox_retry_delay(attempts, outbox_config):
+    delay = min(outbox_config.get('max_delay', 3600), outbox_config.get('base_delay', 30) * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# 将投递结果写回发件箱
+def apply_outbox_results(conn, config, dispatcher):
+    outbox_config = config.get('outbox', {})
+    max_attempts = outbox_config.get('max_attempts', 8)
+    updated = 0
+    while True:
+        try:
+            outbox_id, success, error, finished_at = dispatcher.results.get_nowait()
+        except queue.Empty:
+            break
+        dispatcher.inflight.discard(outbox_id)
+        record_outbox_result(conn, outbox_id, success, error, finished_at, outbox_config, max_attempts)
+        updated += 1
+    if updated:
+        conn.commit()
+
+def record_outbox_result(conn, outbox_id, success, error, finished_at, outbox_config, max_attempts):
+    if success:
+        conn.execute("UPDATE outbox SET status = 'sent', attempts = attempts + 1, delivered_at = ?, last_error = NULL WHERE id = ?",
+                     (finished_at, outbox_id))
+        return
+    attempts = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (outbox_id,)).fetchone()[0] + 1
+    if attempts >= max_attempts:
+        print(f"推送记录 {outbox_id} 已重试 {attempts} 次仍失败，不再重试")
+        conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                     (attempts, error, outbox_id))
+    else:
+        conn.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                     (attempts, finished_at + outbox_retry_delay(attempts, outbox_config), error, outbox_id))
+
+# 投递发件箱中已到期的推送：有分发队列时交给后台线程，否则在当前线程中直接发送
+def drain_outbox(conn, config=None, dispatcher=None):
+    config = config or get_config()
+    outbox_config = config.get('outbox', {})
+    channels = enabled_channels(config.get('push', {}))
+    if dispatcher is not None:
+        apply_outbox_results(conn, config, dispatcher)
     
-    # Discard推送
-    if 'discard' in push_config and push_config['discard'].get('switch', '') == "ON" and push_config['discard'].get('send_normal_msg', '') == "ON":
-        send_discard_msg(push_config['discard'].get('webhook'), title, content, extra_data=extra_data)
+    rows = conn.execute(
+        "SELECT id, channel, title, content, extra_data FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id",
+        (time.time(),)
+    ).fetchall()
+    for outbox_id, channel, title, content, extra_data in rows:
+        if dispatcher is not None and outbox_id in dispatcher.inflight:
+            continue
+        if channel not in channels:
+            # 渠道已关闭，放弃这条推送
+            conn.execute("UPDATE outbox SET status = 'failed', last_error = '渠道已关闭' WHERE id = ?", (outbox_id,))
+            continue
+        message = {
+            'outbox_id': outbox_id,
+            'title': title,
+            'content': content,
+            'extra_data': json.loads(extra_data) if extra_data else None
+        }
+        if dispatcher is not None:
+            dispatcher.inflight.add(outbox_id)
+            dispatcher.submit(message, channels=[channel])
+        else:
+            error = None
+            try:
+                push_config = config.get('push', {})
+                success = send_to_channel(channel, push_config, [message], proxies=get_proxies(config))
+                if not success:
+                    error = '推送失败'
+            except Exception as e:
+                success = False
+                error = str(e)
+            record_outbox_result(conn, outbox_id, success, error, time.time(), outbox_config,
+                                 outbox_config.get('max_attempts', 8))
+    conn.commit()
 
-# 飞书推送
-def send_feishu_msg(webhook, title, content):
-    feishu(title, content, webhook)
+# 休眠指定时间，期间每隔interval秒投递一次到期的发件箱记录
+def sleep_with_outbox(conn, config, dispatcher, seconds, interval=30, stop_event=None):
+    deadline = time.time() + seconds
+    while True:
+        drain_outbox(conn, config, dispatcher)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        # 收到退出信号时立即结束等待
+        if stop_event is None:
+            time.sleep(min(interval, remaining))
+        elif stop_event.wait(min(interval, remaining)):
+            break
 
-# Telegram Bot推送
-def send_tg_bot_msg(token, group_id, title, content):
-    tgbot(title, content, token, group_id)
+# 等待已提交的推送全部返回结果（或超时），并输出投递延迟和重试次数统计
+def flush_outbox(conn, config, dispatcher, timeout=None):
+    config = config or get_config()
+    timeout = config.get('outbox', {}).get('flush_timeout', 120) if timeout is None else timeout
+    deadline = time.time() + timeout
+    drain_outbox(conn, config, dispatcher)
+    while dispatcher.inflight and time.time() < deadline:
+        time.sleep(0.2)
+        apply_outbox_results(conn, config, dispatcher)
+    if dispatcher.inflight:
+        print(f"仍有 {len(dispatcher.inflight)} 条推送未完成，将在下次运行时重试")
+    
+    sent, avg_latency, avg_attempts = conn.execute(
+        "SELECT COUNT(*), AVG(delivered_at - created_at), AVG(attempts) FROM outbox WHERE status = 'sent' AND delivered_at >= ?",
+        (dispatcher.started_at,)
+    ).fetchone()
+    pending = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+    if sent or pending:
+        print(f"推送发件箱：本次送达 {sent} 条，平均延迟 {avg_latency or 0:.1f} 秒，平均尝试 {avg_attempts or 0:.1f} 次，待重试 {pending} 条")
 
 # 钉钉推送
 def dingding(text, msg, webhook, secretKey):
     try:
         if not webhook or webhook == "https://oapi.dingtalk.com/robot/send?access_token=你的token":
             print(f"钉钉推送跳过：webhook地址未配置")
-            return
+            return False
             
         if not secretKey or secretKey == "你的Key":
             print(f"钉钉推送跳过：secret_key未配置")
-            return
+            return False
             
-        ding = cb.DingtalkChatbot(webhook, secret=secretKey)
-        ding.send_text(msg='{}\r\n{}'.format(text, msg), is_at_all=False)
+        ding = get_dingtalk_client(webhook, secretKey)
+        result = ding.send_text(msg='{}\r\n{}'.format(text, msg), is_at_all=False)
+        if result.get('errcode', 0) != 0:
+            print(f"钉钉推送失败: {result.get('errmsg', '未知错误')}")
+            return False
         print(f"钉钉推送成功: {text}")
+        return True
     except Exception as e:
         print(f"钉钉推送失败: {str(e)}")
+        return False
 
 # 飞书推送
 def feishu(text, msg, webhook):
     try:
         if not webhook or webhook == "飞书的webhook地址":
             print(f"飞书推送跳过：webhook地址未配置")
-            return
+            return False
             
         headers = {
             "Content-Type": "application/json;charset=utf-8"
@@ -234,36 +2492,79 @@ def feishu(text, msg, webhook):
         }
         
         # 飞书推送不需要代理
-        response = requests.post(webhook, json=data, headers=headers, timeout=10)
+        response = get_http_session('feishu').post(webhook, json=data, headers=headers, timeout=10)
         response.raise_for_status()
         print(f"飞书推送成功: {text}")
+        return True
     except Exception as e:
         print(f"飞书推送失败: {str(e)}")
+        return False
 
-# 钉钉推送
-def send_dingding_msg(webhook, secret_key, title, content):
-    dingding(title, content, webhook, secret_key)
+DISCARD_FOOTER = "Power By 东方隐侠安全团队·Anonymous@ 隐侠安全客栈"
+# Discord单条消息最多包含10个Embed
+DISCARD_MAX_EMBEDS = 10
 
-# Discard推送
-def send_discard_msg(webhook, title, content, is_daily_report=False, html_file=None, markdown_content=None, extra_data=None):
+# 检查Discard webhook是否可用
+def check_discard_webhook(webhook):
     # 检查是否是占位符
     if not webhook or webhook == "discard的webhook地址":
         print(f"Discard推送跳过：webhook地址未配置")
-        return
+        return False
     
     # 检查webhook地址格式
     if not webhook.startswith('http'):
         print(f"Discard推送失败：webhook地址格式错误，必须以http或https开头")
-        return
+        return False
+    return True
+
+# 文章更新卡片
+def build_discard_article_embed(title, content, extra_data, color=None):
+    fields = [
+        {"name": "标题", "value": content.split('\n')[0].replace('标题: ', ''), "inline": False},
+        {"name": "链接", "value": f"[访问链接]({extra_data.get('link')})", "inline": False},
+        {"name": "推送时间", "value": extra_data.get('timestamp'), "inline": True},
+        {"name": "分类", "value": "安全资讯", "inline": True}
+    ]
+    if extra_data.get('published'):
+        fields.insert(2, {"name": "发布时间", "value": extra_data['published'], "inline": True})
+    if extra_data.get('similar_to'):
+        fields.append({"name": "相似文章", "value": extra_data['similar_to'], "inline": False})
+    return {
+        "title": title,
+        "color": random.randint(0, 0xFFFFFF) if color is None else color,
+        "fields": fields,
+        "footer": {"text": DISCARD_FOOTER},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# 发送Discard请求，遇到429限流时按 retry_after 等待后重试
+def post_discard_payload(webhook, data, proxies=None, max_retries=3):
+    headers = {
+        "Content-Type": "application/json;charset=utf-8"
+    }
+    session = get_http_session('discard', proxies)
+    for attempt in range(max_retries + 1):
+        # 使用较短的超时时间，避免长时间阻塞
+        response = session.post(webhook, json=data, headers=headers, timeout=5)
+        if response.status_code != 429 or attempt == max_retries:
+            return response
+        try:
+            retry_after = float(response.json().get('retry_after', 1))
+        except ValueError:
+            retry_after = float(response.headers.get('Retry-After', 1))
+        print(f"Discard推送被限流，{retry_after:.1f} 秒后重试")
+        time.sleep(retry_after)
+    return response
+
+# Discard推送
+def send_discard_msg(webhook, title, content, is_daily_report=False, html_file=None, markdown_content=None, extra_data=None, proxies=None):
+    if not check_discard_webhook(webhook):
+        return False
     
     try:
-        headers = {
-            "Content-Type": "application/json;charset=utf-8"
-        }
-        
         # 统一随机颜色
         random_color = random.randint(0, 0xFFFFFF)
-        footer_text = "Power By 东方隐侠安全团队·Anonymous@ 隐侠安全客栈"
+        footer_text = DISCARD_FOOTER
         
         if is_daily_report and html_file:
             # 推送日报，Discord Webhook不支持直接发送HTML格式，使用文本格式发送链接
@@ -304,18 +2605,7 @@ def send_discard_msg(webhook, title, content, is_daily_report=False, html_file=N
         elif extra_data and extra_data.get('is_article'):
             # 文章更新卡片
             data = {
-                "embeds": [{
-                    "title": title,
-                    "color": random_color,
-                    "fields": [
-                        {"name": "标题", "value": content.split('\n')[0].replace('标题: ', ''), "inline": False},
-                        {"name": "链接", "value": f"[访问链接]({extra_data.get('link')})", "inline": False},
-                        {"name": "推送时间", "value": extra_data.get('timestamp'), "inline": True},
-                        {"name": "分类", "value": "安全资讯", "inline": True}
-                    ],
-                    "footer": {"text": footer_text},
-                    "timestamp": datetime.utcnow().isoformat()
-                }]
+                "embeds": [build_discard_article_embed(title, content, extra_data, random_color)]
             }
         else:
             # 兼容旧格式推送文本
@@ -326,22 +2616,459 @@ def send_discard_msg(webhook, title, content, is_daily_report=False, html_file=N
         print(f"正在发送Discard推送：{title}")
         
         # 获取代理配置
-        proxies = get_proxies()
+        if proxies is None:
+            proxies = get_proxies()
         
-        # 使用较短的超时时间，避免长时间阻塞
-        response = requests.post(webhook, json=data, headers=headers, timeout=5, proxies=proxies)
+        response = post_discard_payload(webhook, data, proxies)
         
         # 检查响应状态
         if response.status_code in [200, 204]:
             print(f"Discard推送成功: {title}")
-        else:
-            print(f"Discard推送失败: HTTP状态码 - {response.status_code}")
+            return True
+        print(f"Discard推送失败: HTTP状态码 - {response.status_code}")
+        return False
     except Exception as e:
         print(f"Discard推送失败: 未知错误 - {str(e)}")
+        return False
+
+# Discard合并推送：多篇文章以多个Embed的形式发送，每条消息最多10个
+def send_discard_batch(webhook, messages, proxies=None):
+    if not check_discard_webhook(webhook):
+        return False
+    
+    if proxies is None:
+        proxies = get_proxies()
+    
+    success = True
+    for i in range(0, len(messages), DISCARD_MAX_EMBEDS):
+        chunk = messages[i:i + DISCARD_MAX_EMBEDS]
+        data = {
+            "embeds": [
+                build_discard_article_embed(message['title'], message['content'], message.get('extra_data') or {})
+                for message in chunk
+            ]
+        }
+        print(f"正在发送Discard合并推送：{len(chunk)} 篇文章")
+        try:
+            response = post_discard_payload(webhook, data, proxies)
+            if response.status_code in [200, 204]:
+                print(f"Discard合并推送成功: {len(chunk)} 篇文章")
+            else:
+                print(f"Discard合并推送失败: HTTP状态码 - {response.status_code}")
+                success = False
+        except Exception as e:
+            print(f"Discard合并推送失败: 未知错误 - {str(e)}")
+            success = False
+    return success
+
+# 日报清单：记录每天的文章数、文件路径和文章集合摘要，index.html 直接由清单渲染
+MANIFEST_FILE = 'archive/manifest.json'
+
+# 扫描archive目录重建日报清单（仅在清单不存在时执行一次）
+def build_manifest_from_archive():
+    manifest = {'days': {}}
+    if not os.path.exists('archive'):
+        return manifest
+    for date_dir in sorted(os.listdir('archive')):
+        html_file = f'archive/{date_dir}/Daily_{date_dir}.html'
+        if not os.path.isdir(os.path.join('archive', date_dir)) or not os.path.exists(html_file):
+            continue
+        # 从markdown文件中提取文章数量
+        count = 0
+        md_file = f'archive/{date_dir}/Daily_{date_dir}.md'
+        if os.path.exists(md_file):
+            with open(md_file, 'r', encoding='utf-8') as f:
+                match = re.search(r'共收集到 (\d+) 篇文章', f.read())
+                if match:
+                    count = int(match.group(1))
+        manifest['days'][date_dir] = {'count': count, 'md': md_file, 'html': html_file, 'digest': None}
+    return manifest
+
+# 读取日报清单，不存在或损坏时从archive目录重建
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('days'), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"读取日报清单出错: {str(e)}，将重新扫描archive目录")
+    print("正在根据archive目录生成日报清单...")
+    return build_manifest_from_archive()
+
+# 原子写入文件：先写临时文件再替换，避免中途退出留下不完整的文件
+def write_file_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    if isinstance(content, bytes):
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    os.replace(tmp_path, path)
+
+# 保存日报清单
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    write_file_atomic(MANIFEST_FILE, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+# 文章集合摘要：链接集合不变时摘要不变（链接需按顺序传入，可直接使用 ORDER BY link 的查询结果）
+def articles_digest(links):
+    digest = hashlib.sha1()
+    for link in links:
+        digest.update(link.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+# 全文索引使用的分词器，未建立索引时返回None
+def fts_tokenizer(cursor):
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'items_fts'")
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    match = re.search(r"tokenize\s*=\s*'(\w+)", row[0])
+    return match.group(1) if match else 'unicode61'
+
+# 新写入的文章加入全文索引（摘要使用明文），summaries为 {链接哈希: 摘要}，只索引id大于last_id的
+# 新行（INSERT OR IGNORE 跳过的已有文章不重复索引）；与写入items在同一个事务中调用。没有全文索引时跳过
+def index_items(cursor, summaries, last_id=0):
+    if not summaries or fts_tokenizer(cursor) is None:
+        return
+    cursor.executemany(
+        "INSERT INTO items_fts (rowid, title, source, summary) "
+        "SELECT id, title, source, ? FROM items WHERE link_hash = ? AND id > ?",
+        [(summary, key, last_id) for key, summary in summaries.items()]
+    )
+
+# 从全文索引中删除文章：无内容的FTS5表删除时需要提供写入时的原值，records为包含id、title、source和明文summary的字典
+def unindex_items(cursor, records):
+    cursor.executemany(
+        "INSERT INTO items_fts (items_fts, rowid, title, source, summary) VALUES ('delete', ?, ?, ?, ?)",
+        [(record['id'], record['title'], record['source'], record['summary']) for record in records]
+    )
+
+# 摘要中第一个关键词附近的片段，关键词用[]标出
+def summary_snippet(summary, terms, width=30):
+    if not summary:
+        return None
+    lowered = summary.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - width) if positions else 0
+    end = min(len(summary), start + width * 3)
+    text = summary[start:end]
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    text = pattern.sub(lambda match: f'[{match.group(0)}]', text)
+    return f"{'…' if start > 0 else ''}{text}{'…' if end < len(summary) else ''}"
+
+# 全文搜索：空格分隔的关键词须全部出现，按bm25排序（标题权重最高）。
+# trigram分词只能索引3个字符以上的词，更短的词（如“漏洞”）退回LIKE匹配
+def search_items(cursor, query, since=None, source=None, limit=20):
+    tokenizer = fts_tokenizer(cursor)
+    if tokenizer is None:
+        raise RuntimeError("全文索引不可用，请确认SQLite支持FTS5")
+    terms = [term for term in query.split() if term]
+    if not terms:
+        return []
+    min_length = 3 if tokenizer == 'trigram' else 1
+    match_terms = [term for term in terms if len(term) >= min_length]
+    like_terms = [term for term in terms if len(term) < min_length]
+    
+    # 全文索引不保存原文，短词的LIKE匹配和摘要片段都读取items中的摘要，
+    # 解压函数只注册在当前连接上，用于本次查询，数据库结构本身不依赖它
+    cursor.connection.create_function('rss_unzip', 1, unpack_summary, deterministic=True)
+    where, params = [], []
+    if match_terms:
+        where.append("items_fts MATCH ?")
+        params.append(' AND '.join('"{}"'.format(term.replace('"', '""')) for term in match_terms))
+    for term in like_terms:
+        where.append("(items.title || ' ' || IFNULL(items.source, '') || ' ' || IFNULL(rss_unzip(items.summary), '')) LIKE ?")
+        params.append(f'%{term}%')
+    if since:
+        where.append("items.timestamp >= ?")
+        params.append(since)
+    if source:
+        where.append("items.source LIKE ?")
+        params.append(f'%{source}%')
+    if match_terms:
+        tables, order = "items_fts JOIN items ON items.id = items_fts.rowid", "bm25(items_fts, 10.0, 2.0, 3.0)"
+    else:
+        tables, order = "items", "items.timestamp DESC"
+    cursor.execute(
+        f"""SELECT items.title, items.link, items.source, items.timestamp, items.summary
+            FROM {tables}
+            WHERE {' AND '.join(where)}
+            ORDER BY {order} LIMIT ?""",
+        params + [limit]
+    )
+    return [(title, link, item_source, timestamp, summary_snippet(unpack_summary(summary), terms))
+            for title, link, item_source, timestamp, summary in cursor.fetchall()]
+
+# 在静态搜索分片中查找已归档的文章（数据库只保留近期文章的全文索引），
+# 与页面上的搜索相同：关键词须全部出现在标题、来源或链接中。返回 (标题, 链接, 来源, 日期, None)
+def search_archive_shards(query, since=None, source=None, limit=20, exclude_links=()):
+    terms = [term.lower() for term in query.split() if term]
+    results = []
+    for path in sorted(glob.glob(f'{SEARCH_DIR}/*-*.json'), reverse=True):
+        if since and os.path.basename(path)[:7] < since[:7]:
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for title, link, item_source, date in rows:
+            if link in exclude_links or (since and (date or '') < since[:10]):
+                continue
+            if source and source.lower() not in (item_source or '').lower():
+                continue
+            text = f"{title} {item_source or ''} {link}".lower()
+            if all(term in text for term in terms):
+                results.append((title, link, item_source, date, None))
+                if len(results) >= limit:
+                    return results
+    return results
+
+# 打印搜索结果：先查数据库的全文索引，不足limit篇时再查已归档文章的搜索分片
+def print_search_results(cursor, query, since=None, source=None, limit=20):
+    results = search_items(cursor, query, since, source, limit)
+    if len(results) < limit:
+        results += search_archive_shards(query, since, source, limit - len(results),
+                                         {row[1] for row in results})
+    if not results:
+        print(f"没有找到与“{query}”相关的文章")
+        return
+    print(f"找到 {len(results)} 篇与“{query}”相关的文章：")
+    for title, link, item_source, timestamp, snippet in results:
+        print(f"\n[{timestamp}] {title}（{item_source or '-'}）\n  {link}")
+        if snippet:
+            print(f"  {snippet}")
+
+# 从archive目录的Markdown日报导入历史文章，已收录的链接会被跳过
+def backfill_archive(conn, archive_dir='archive'):
+    pattern = re.compile(r'^## \[(.*)\]\((\S+)\)\s*$')
+    rows = []
+    for path in sorted(glob.glob(os.path.join(archive_dir, '*', 'Daily_*.md'))):
+        date = os.path.basename(os.path.dirname(path))
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        for i, line in enumerate(lines):
+            match = pattern.match(line)
+            if not match:
+                continue
+            title, link = match.groups()
+            timestamp = f'{date} 00:00:00'
+            if i + 1 < len(lines) and lines[i + 1].startswith('发布时间：'):
+                timestamp = lines[i + 1][len('发布时间：'):].strip() or timestamp
+            rows.append((title, link, link_hash(link), 'archive', timestamp))
+    # 已归档（只保留哈希）的文章不再导入
+    known = find_known_links(conn.cursor(), [row[2] for row in rows])
+    # total_changes 还包含全文索引的写入，按插入前后的行数计算导入数量
+    before = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    before_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM items").fetchone()[0]
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO items (title, link, link_hash, source, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [row for row in rows if row[2] not in known]
+        )
+        index_items(conn.cursor(), {row[2]: None for row in rows if row[2] not in known}, before_id)
+    imported = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] - before
+    print(f"从archive目录读取 {len(rows)} 篇文章，新导入 {imported} 篇")
+    return imported
+
+# 搜索分片放在archive目录下，随日报一起由GitHub Action提交发布
+SEARCH_DIR = 'archive/search'
+
+# 生成静态搜索分片：每月一个JSON文件（[标题, 链接, 来源, 日期]），供GitHub Pages上的index.html在浏览器中搜索。
+# months为None时重新生成全部分片，否则只生成指定月份
+def write_search_shards(cursor, months=None):
+    os.makedirs(SEARCH_DIR, exist_ok=True)
+    if months is None:
+        cursor.execute("SELECT DISTINCT strftime('%Y-%m', timestamp) FROM items WHERE timestamp IS NOT NULL")
+        months = [row[0] for row in cursor.fetchall() if row[0]]
+    for month in months:
+        cursor.execute(
+            "SELECT title, link, source, date(timestamp) FROM items "
+            "WHERE timestamp >= ? AND timestamp < date(?, '+1 month') AND dup_of IS NULL ORDER BY timestamp DESC",
+            (f'{month}-01', f'{month}-01')
+        )
+        rows = [list(row) for row in cursor.fetchall()]
+        write_file_atomic(f'{SEARCH_DIR}/{month}.json', json.dumps(rows, ensure_ascii=False, separators=(',', ':')))
+    
+    # 分片清单按月份倒序，页面从最近的月份开始加载
+    shards = sorted(
+        (os.path.basename(path)[:-len('.json')] for path in glob.glob(f'{SEARCH_DIR}/*-*.json')),
+        reverse=True
+    )
+    write_file_atomic(f'{SEARCH_DIR}/manifest.json', json.dumps(
+        {'updated': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+         'shards': [f'{SEARCH_DIR}/{month}.json' for month in shards]},
+        ensure_ascii=False
+    ))
+    print(f"搜索分片已更新：{', '.join(months) if months else '无'}")
+
+ARCHIVE_COLUMNS = ('id', 'title', 'link', 'link_hash', 'source', 'timestamp', 'summary', 'simhash', 'dup_of',
+                   'published', 'author', 'tags')
+
+# 数据保留：早于保留期的文章按整月归档到 archive_dir/items-YYYY-MM.jsonl.gz，从数据库删除后
+# 只在seen_links中保留哈希，同时从全文索引中删除；归档前先生成这些月份的静态搜索分片，
+# 已归档的文章通过分片搜索（页面搜索框和 --search）。只归档完整的月份，每个归档文件基本只写一次，减少仓库提交的变动
+def apply_retention(conn, config=None):
+    retention_config = (config or get_config()).get('retention', {})
+    if retention_config.get('switch', 'ON') != 'ON':
+        return 0
+    hot_days = max(1, retention_config.get('hot_days', 30))
+    archive_dir = retention_config.get('archive_dir', 'archive/db')
+    cutoff_day = datetime.utcnow() - timedelta(days=hot_days)
+    cutoff = cutoff_day.strftime('%Y-%m-01')
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM items WHERE timestamp < ? LIMIT 1", (cutoff,))
+    if cursor.fetchone() is None:
+        return 0
+    
+    print(f"开始归档 {cutoff} 之前的文章...")
+    has_fts = fts_tokenizer(cursor) is not None
+    cursor.execute(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM items WHERE timestamp < ? ORDER BY id", (cutoff,))
+    months = {}
+    for row in cursor.fetchall():
+        record = dict(zip(ARCHIVE_COLUMNS, row))
+        record['summary'] = unpack_summary(record['summary'])
+        months.setdefault((record['timestamp'] or '')[:7] or 'unknown', []).append(record)
+    
+    write_search_shards(cursor, [month for month in sorted(months) if re.fullmatch(r'\d{4}-\d{2}', month)])
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, records in sorted(months.items()):
+        path = os.path.join(archive_dir, f'items-{month}.jsonl.gz')
+        # 已有归档时合并，按链接哈希去重
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                existing = [json.loads(line) for line in f if line.strip()]
+            seen = {record['link_hash'] for record in records}
+            records = [record for record in existing if record.get('link_hash') not in seen] + records
+            records.sort(key=lambda record: (record.get('timestamp') or '', record.get('id') or 0))
+        content = ''.join(json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n' for record in records)
+        # mtime固定为0，内容不变时压缩结果也不变
+        write_file_atomic(path, gzip.compress(content.encode('utf-8'), mtime=0))
+    
+    archived = sum(len(records) for records in months.values())
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO seen_links (hash) VALUES (?)",
+                         [(seen_hash(record['link_hash']),) for records in months.values() for record in records
+                          if record['link_hash']])
+        conn.execute("DELETE FROM items WHERE timestamp < ?", (cutoff,))
+        if has_fts:
+            unindex_items(conn.cursor(), [record for records in months.values() for record in records])
+        # 已完成的推送记录同样只保留保留期内的
+        conn.execute("DELETE FROM outbox WHERE status != 'pending' AND created_at < ?",
+                     (calendar.timegm(time.strptime(cutoff, '%Y-%m-%d')),))
+    
+    # FTS5删除只写入删除标记，合并索引段后才真正释放空间
+    if has_fts:
+        with conn:
+            conn.execute("INSERT INTO items_fts (items_fts) VALUES ('optimize')")
+    
+    # 首次归档时切换为增量回收模式（需要一次完整VACUUM生效），之后只回收空闲页
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute("PRAGMA incremental_vacuum")
+    print(f"已归档 {archived} 篇文章到 {archive_dir}（{', '.join(sorted(months))}）")
+    return archived
+
+# 当天（UTC）收录的文章，使用范围查询以便命中timestamp索引
+REPORT_DAY_WHERE = "timestamp >= date('now') AND timestamp < date('now', '+1 day')"
+REPORT_COLUMNS = "id, title, link, timestamp, source, published"
+
+# 收录时间（UTC字符串）转为时间戳，格式不对时返回None
+def parse_utc_timestamp(timestamp):
+    try:
+        return calendar.timegm(time.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+# 日报中的文章；没有发布时间时用收录时间代替，两者都转为本地时间显示
+def report_article(row):
+    item_id, title, link, timestamp, source, published = row
+    published = published or parse_utc_timestamp(timestamp)
+    return {'title': title, 'link': link, 'timestamp': timestamp, 'source': source, 'duplicates': [],
+            'published': format_ts(published, '%Y-%m-%d %H:%M:%S') if published else None}
+
+# 日报中显示的文章的查询条件。重复文章：suppress模式下不显示；group模式下归到当天的原文下，原文不在当天时单独显示
+def report_filter(dedup_config):
+    if dedup_config.get('switch', 'ON') != 'ON':
+        return REPORT_DAY_WHERE
+    if dedup_config.get('mode', 'suppress') == 'group':
+        return f"{REPORT_DAY_WHERE} AND (dup_of IS NULL OR dup_of NOT IN (SELECT id FROM items WHERE {REPORT_DAY_WHERE}))"
+    return f"{REPORT_DAY_WHERE} AND dup_of IS NULL"
+
+# 按发布时间倒序（没有发布时间的按收录时间）逐条读取日报文章，不一次性载入内存；
+# group模式下归到原文下的重复文章数量很少，预先读取
+def iter_report_articles(conn, dedup_config, offset=0, limit=-1):
+    duplicates = {}
+    if dedup_config.get('switch', 'ON') == 'ON' and dedup_config.get('mode', 'suppress') == 'group':
+        rows = conn.execute(
+            f"SELECT dup_of, {REPORT_COLUMNS} FROM items WHERE {REPORT_DAY_WHERE} "
+            f"AND dup_of IN (SELECT id FROM items WHERE {REPORT_DAY_WHERE}) ORDER BY id"
+        )
+        for row in rows:
+            duplicates.setdefault(row[0], []).append(report_article(row[1:]))
+    rows = conn.execute(
+        f"SELECT {REPORT_COLUMNS} FROM items WHERE {report_filter(dedup_config)} "
+        "ORDER BY COALESCE(published, CAST(strftime('%s', timestamp) AS INTEGER)) DESC, id DESC LIMIT ? OFFSET ?",
+        (limit, offset)
+    )
+    for row in rows:
+        article = report_article(row)
+        article['duplicates'] = duplicates.get(row[0], [])
+        yield article
+
+# 流式渲染模板并写入文件：逐块写出 generate() 的结果，写完后替换原文件
+def render_to_file(template_name, path, **context):
+    template = get_template_env().get_template(template_name)
+    tmp_path = f'{path}.tmp'
+    with METRICS.timed('stage_seconds', stage='report_render'), open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(template.generate(**context))
+    os.replace(tmp_path, path)
+
+# 日报第k页的文件名，第1页沿用 Daily_日期.html，index.html 和已推送的链接保持不变
+def report_page_file(archive_dir, date, page):
+    return f'{archive_dir}/Daily_{date}.html' if page == 1 else f'{archive_dir}/Daily_{date}_p{page}.html'
+
+# 当天文章的JSON数据文件，供日报页面按需加载其余文章；逐条写入，不在内存中保存全部文章
+def write_report_data(path, articles, **meta):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(meta, ensure_ascii=False)[:-1] + ', "articles": [')
+        for index, article in enumerate(articles):
+            f.write(('\n' if index == 0 else ',\n') + json.dumps(article, ensure_ascii=False))
+        f.write('\n]}\n')
+    os.replace(tmp_path, path)
+
+# 模板环境：优先使用当前目录下的模板，其次是脚本所在目录；编译结果缓存在cache目录，
+# 模板文件修改后按修改时间自动重新加载
+TEMPLATE_DIRS = ['.', os.path.dirname(os.path.abspath(__file__))]
+TEMPLATE_CACHE_DIR = 'cache/jinja2'
+_template_env = None
+
+def get_template_env():
+    global _template_env
+    if _template_env is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        _template_env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIRS),
+            bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+            auto_reload=True,
+            keep_trailing_newline=True
+        )
+    return _template_env
 
 # 生成日报
 
-def generate_daily_report(cursor):
+def generate_daily_report(cursor, config=None):
     print("开始生成日报...")
     
     # 获取当前日期和时间
@@ -352,217 +3079,108 @@ def generate_daily_report(cursor):
     archive_dir = f'archive/{current_date}'
     os.makedirs(archive_dir, exist_ok=True)
     
-    # 从数据库中获取当天的所有文章
-    cursor.execute("SELECT title, link, timestamp FROM items WHERE date(timestamp) = date('now') ORDER BY timestamp DESC")
-    articles = cursor.fetchall()
-    
-    # 生成markdown内容
-    markdown_content = f"# RSS日报 {current_date}\n\n"
-    markdown_content += f"共收集到 {len(articles)} 篇文章\n"
-    markdown_content += f"最后更新时间：{current_time}\n\n"
-    
-    # 准备文章数据，用于HTML模板
-    article_list = []
-    for article in articles:
-        title, link, timestamp = article
-        markdown_content += f"## [{title}]({link})\n"
-        markdown_content += f"发布时间：{timestamp}\n\n"
-        
-        # 添加到文章列表
-        article_list.append({
-            'title': title,
-            'link': link,
-            'timestamp': timestamp
-        })
+    # 文章数和文章集合摘要只需逐行读取链接，文章内容在渲染时按页从数据库读取
+    conn = cursor.connection
+    config = config or get_config()
+    dedup_config = config.get('dedup', {})
+    page_size = max(1, config.get('daily_report', {}).get('page_size', 500))
+    count = conn.execute(f"SELECT COUNT(*) FROM items WHERE {report_filter(dedup_config)}").fetchone()[0]
+    pages = max(1, -(-count // page_size))
     
-    # 添加Power By信息（纯markdown格式，避免HTML标签在Discord中显示为文本）
-    markdown_content += f"---\n"
-    markdown_content += f"Power By 东方隐侠安全团队·Anonymous@ [隐侠安全客栈](https://www.dfyxsec.com/)\n"
-    markdown_content += f"---\n"
-    
-    # 写入markdown文件
     markdown_file = f'{archive_dir}/Daily_{current_date}.md'
-    is_update = os.path.exists(markdown_file)
-    with open(markdown_file, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    html_file = report_page_file(archive_dir, current_date, 1)
+    data_file = f'{archive_dir}/Daily_{current_date}.json'
     
-    if is_update:
-        print(f"Markdown日报已更新：{markdown_file}")
-    else:
-        print(f"Markdown日报已生成：{markdown_file}")
+    # 当天文章集合没有变化时，不重写日报和index.html
+    manifest = load_manifest()
+    digest = articles_digest(row[0] for row in conn.execute(f"SELECT link FROM items WHERE {REPORT_DAY_WHERE} ORDER BY link"))
+    day_entry = manifest['days'].get(current_date)
+    unchanged = (day_entry is not None and day_entry.get('digest') == digest and day_entry.get('pages') == pages
+                 and all(os.path.exists(path) for path in (markdown_file, html_file, data_file)))
+    if unchanged:
+        print(f"当天文章没有变化（{count} 篇），跳过重写日报")
     
-    # 生成HTML内容
-    try:
-        # 读取HTML模板
-        with open('template.html', 'r', encoding='utf-8') as f:
-            template_content = f.read()
-        
-        # 渲染HTML模板
-        template = Template(template_content)
-        html_content = template.render(
-            date=current_date,
-            count=len(articles),
-            update_time=current_time,
-            articles=article_list
-        )
-        
-        # 写入HTML文件
-        html_file = f'{archive_dir}/Daily_{current_date}.html'
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+    # 写入markdown文件（Power By信息为纯markdown格式，避免HTML标签在Discord中显示为文本）
+    is_update = os.path.exists(markdown_file)
+    if not unchanged:
+        render_to_file('template.md', markdown_file, date=current_date, count=count, update_time=current_time,
+                       articles=iter_report_articles(conn, dedup_config))
         
         if is_update:
-            print(f"HTML日报已更新：{html_file}")
+            print(f"Markdown日报已更新：{markdown_file}")
         else:
-            print(f"HTML日报已生成：{html_file}")
-        
-        # 更新index.html
-        update_index_html(current_date, article_list, len(articles))
+            print(f"Markdown日报已生成：{markdown_file}")
+    
+    # 生成HTML内容
+    try:
+        if not unchanged:
+            # 文章较多时分页，每页只渲染本页的文章；页面可从JSON数据文件继续加载后面的文章
+            write_report_data(data_file, iter_report_articles(conn, dedup_config), date=current_date, count=count,
+                              update_time=current_time, page_size=page_size, pages=pages)
+            page_links = [(page, os.path.basename(report_page_file(archive_dir, current_date, page)))
+                          for page in range(1, pages + 1)]
+            for page in range(1, pages + 1):
+                render_to_file('template.html', report_page_file(archive_dir, current_date, page),
+                               date=current_date, count=count, update_time=current_time,
+                               articles=iter_report_articles(conn, dedup_config, (page - 1) * page_size, page_size),
+                               page=page, pages=pages, page_links=page_links, page_size=page_size,
+                               data_file=os.path.basename(data_file))
+            # 文章减少（如调整了去重配置）后多余的分页
+            for path in glob.glob(f'{archive_dir}/Daily_{current_date}_p*.html'):
+                match = re.search(r'_p(\d+)\.html$', path)
+                if match and int(match.group(1)) > pages:
+                    os.remove(path)
+            
+            if is_update:
+                print(f"HTML日报已更新：{html_file}（共 {pages} 页）")
+            else:
+                print(f"HTML日报已生成：{html_file}（共 {pages} 页）")
+            
+            # 只更新当天的清单记录，再由清单渲染index.html
+            manifest['days'][current_date] = {
+                'count': count,
+                'md': markdown_file,
+                'html': html_file,
+                'pages': pages,
+                'data': data_file,
+                'digest': digest
+            }
+            save_manifest(manifest)
+            update_index_html(manifest)
+            # 只重新生成当月的搜索分片
+            write_search_shards(cursor, [current_date[:7]])
         
         # Discard推送日报
-        config = load_config()
         push_config = config.get('push', {})
         if 'discard' in push_config and push_config['discard'].get('switch', '') == "ON" and push_config['discard'].get('send_daily_report', '') == "ON":
             send_discard_msg(
                 push_config['discard'].get('webhook'),
                 f"RSS日报 {current_date}",
-                f"共收集到 {len(articles)} 篇文章",
+                f"共收集到 {count} 篇文章",
                 is_daily_report=True,
                 html_file=html_file,
-                markdown_content=markdown_content
+                proxies=get_proxies(config)
             )
         
     except Exception as e:
         print(f"生成HTML日报失败：{str(e)}")
     
-    return markdown_file, markdown_content
+    return markdown_file, html_file
 
-# 更新index.html
-def update_index_html(current_date, article_list, count):
+# 更新index.html：直接使用日报清单中的日期、路径和文章数，不再读取每天的日报文件
+def update_index_html(manifest=None):
     print("更新index.html...")
+    manifest = manifest or load_manifest()
     
-    # 创建index.html模板
-    index_template = """<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>RSS日报</title>
-    <style>
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, 'Open Sans', 'Helvetica Neue', sans-serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }
-        header {
-            background-color: #4285f4;
-            color: white;
-            padding: 20px;
-            border-radius: 8px;
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        h1 {
-            margin: 0;
-            font-size: 2rem;
-        }
-        h2 {
-            font-size: 1.5rem;
-            margin-bottom: 20px;
-        }
-        .report-list {
-            list-style: none;
-            padding: 0;
-        }
-        .report-item {
-            background-color: white;
-            padding: 20px;
-            margin-bottom: 15px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-        }
-        .report-link {
-            color: #4285f4;
-            text-decoration: none;
-            font-size: 1.2rem;
-            font-weight: bold;
-        }
-        .report-link:hover {
-            text-decoration: underline;
-        }
-        .report-info {
-            color: #666;
-            font-size: 0.9rem;
-            margin-top: 5px;
-        }
-        footer {
-            text-align: center;
-            margin-top: 50px;
-            color: #666;
-            font-size: 0.9rem;
-        }
-    </style>
-</head>
-<body>
-    <header>
-        <h1>RSS日报</h1>
-        <div>每日安全社区文章汇总</div>
-    </header>
-    
-    <main>
-        <h2>日报列表</h2>
-        <ul class="report-list">
-            {% for report in reports %}
-            <li class="report-item">
-                <a href="{{ report.path }}" class="report-link" target="_blank">{{ report.date }}</a>
-                <div class="report-info">共 {{ report.count }} 篇文章</div>
-            </li>
-            {% endfor %}
-        </ul>
-    </main>
-    
-    <footer>
-        <p>Generated by RSS Monitor</p>
-    </footer>
-</body>
-</html>
-    """
-    
-    # 获取所有已生成的日报
-    reports = []
-    
-    # 遍历archive目录下的所有日期目录
-    if os.path.exists('archive'):
-        for date_dir in sorted(os.listdir('archive'), reverse=True):
-            if os.path.isdir(os.path.join('archive', date_dir)):
-                # 检查该日期目录下是否存在HTML文件
-                html_file = f'archive/{date_dir}/Daily_{date_dir}.html'
-                if os.path.exists(html_file):
-                    # 尝试获取文章数量
-                    count = 0
-                    md_file = f'archive/{date_dir}/Daily_{date_dir}.md'
-                    if os.path.exists(md_file):
-                        with open(md_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            # 从markdown文件中提取文章数量
-                            import re
-                            match = re.search(r'共收集到 (\d+) 篇文章', content)
-                            if match:
-                                count = match.group(1)
-                    
-                    reports.append({
-                        'date': date_dir,
-                        'path': html_file,
-                        'count': count
-                    })
+    # 按日期倒序列出所有已生成的日报
+    reports = [
+        {'date': date, 'path': day['html'], 'count': day['count']}
+        for date, day in sorted(manifest['days'].items(), reverse=True)
+    ]
     
     # 渲染index.html
-    template = Template(index_template)
-    html_content = template.render(reports=reports)
+    with METRICS.timed('stage_seconds', stage='report_render'):
+        html_content = get_template_env().get_template('index_template.html').render(reports=reports)
     
     # 写入index.html文件
     with open('index.html', 'w', encoding='utf-8') as f:
@@ -571,34 +3189,130 @@ def update_index_html(current_date, article_list, count):
     print("index.html已更新")
 
 # Telegram Bot推送
-def tgbot(text, msg, token, group_id):
-    import telegram
+def tgbot(text, msg, token, group_id, proxies=None, api_url=None):
     try:
         if not token or token == "Telegram Bot的token":
             print(f"Telegram推送跳过：token未配置")
-            return
+            return False
             
         if not group_id or group_id == "Telegram Bot的group_id":
             print(f"Telegram推送跳过：group_id未配置")
-            return
+            return False
             
         # 获取代理配置
-        proxies = get_proxies()
+        if proxies is None:
+            proxies = get_proxies()
         
-        if proxies:
-            # 配置telegram bot使用代理
-            request_kwargs = {'proxies': proxies}
-            bot = telegram.Bot(token=token, request_kwargs=request_kwargs)
-        else:
-            bot = telegram.Bot(token=token)
-            
+        bot = get_telegram_bot(token, proxies, api_url)
         bot.send_message(chat_id=group_id, text=f'{text}\n{msg}')
         print(f"Telegram推送成功: {text}")
+        return True
     except Exception as e:
         print(f"Telegram推送失败: {str(e)}")
+        return False
 
 # 主函数
 
+# 各推送渠道首次发送时导入的第三方库
+CHANNEL_MODULES = {
+    'dingding': ['requests', 'dingtalkchatbot.chatbot'],
+    'feishu': ['requests'],
+    'tg_bot': ['telegram'],
+    'discard': ['requests'],
+}
+
+# 导入单个模块并返回耗时（秒），已加载过的模块返回None
+def timed_import(name):
+    if name in sys.modules:
+        return None
+    start = time.perf_counter()
+    importlib.import_module(name)
+    return time.perf_counter() - start
+
+# 分阶段统计启动耗时：按当前配置逐个导入依赖、加载配置、初始化数据库、编译模板、创建推送客户端等，
+# 用于定位 --once 冷启动的瓶颈。模块导入耗时按依赖顺序测量，共享的子依赖计入先导入的模块
+def profile_startup(once=True):
+    rows = [('导入 Rss_monitor', _MODULE_READY - _MODULE_START, '是')]
+    
+    def step(name, func, needed=True):
+        start = time.perf_counter()
+        try:
+            func()
+            note = '是' if needed else '否'
+        except Exception as e:
+            note = f"失败: {str(e)}"
+        rows.append((name, time.perf_counter() - start, note))
+    
+    step('加载配置', get_config)
+    config = get_config()
+    push_config = config.get('push', {})
+    channels = [name for name, service in push_config.items() if service.get('switch', 'OFF') == 'ON']
+    report = config.get('daily_report', {}).get('switch', 'ON') == 'ON'
+    needed = {'requests', 'feedparser'}
+    if report:
+        needed.add('jinja2')
+    for channel in channels:
+        needed.update(CHANNEL_MODULES.get(channel, []))
+    
+    for name in ('requests', 'feedparser', 'jinja2', 'dingtalkchatbot.chatbot', 'telegram'):
+        try:
+            seconds = timed_import(name)
+        except ImportError:
+            rows.append((f'导入 {name}', 0.0, '未安装'))
+            continue
+        note = '是' if name in needed else '否'
+        rows.append((f'导入 {name}', seconds or 0.0, note if seconds is not None else f'{note}（已随其他模块加载）'))
+    
+    # 在临时副本上初始化数据库，统计包含待执行的迁移，但不修改 articles.db
+    import tempfile
+    tmp_dir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp_dir.name, 'articles.db')
+    conn = None
+    try:
+        if os.path.exists('articles.db'):
+            source = sqlite3.connect('file:articles.db?mode=ro', uri=True)
+            with sqlite3.connect(db_path) as copy:
+                source.backup(copy)
+            copy.close()
+            source.close()
+        start = time.perf_counter()
+        conn = init_database(db_path)
+        rows.append(('初始化数据库（临时副本）', time.perf_counter() - start, '是'))
+        cursor = conn.cursor()
+        
+        def compile_templates():
+            env = get_template_env()
+            for template in ('template.md', 'template.html', 'index_template.html'):
+                env.get_template(template)
+        step('编译日报模板', compile_templates, report)
+        
+        def create_clients():
+            proxies = get_proxies(config)
+            for channel in channels:
+                service = push_config[channel]
+                if channel == 'dingding':
+                    get_dingtalk_client(service.get('webhook'), service.get('secret_key'))
+                elif channel == 'tg_bot':
+                    get_telegram_bot(service.get('token'), proxies, service.get('api_url'))
+                else:
+                    get_http_session(channel, proxies)
+        step(f"创建推送客户端（{', '.join(channels) or '无'}）", create_clients, bool(channels))
+        step('加载近似重复索引', lambda: open_dedup_index(cursor, config),
+             config.get('dedup', {}).get('switch', 'ON') == 'ON')
+        step('编译推送规则', lambda: get_rules_engine(config), config.get('rules', {}).get('switch', 'OFF') == 'ON')
+    except Exception as e:
+        print(f"启动耗时统计失败: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
+        tmp_dir.cleanup()
+    
+    print(f"{'耗时(ms)':>10}  阶段（{'单次执行' if once else '循环模式'}是否需要）")
+    for name, seconds, note in rows:
+        print(f"{seconds * 1000:>10.1f}  {name}（{note}）")
+    print(f"{(time.perf_counter() - _MODULE_START) * 1000:>10.1f}  合计（自模块开始导入）")
+    print("解释器启动和标准库导入不在统计范围内，可用 python -X importtime Rss_monitor.py --profile-startup 查看明细")
+
 def main():
     banner = f'''
     +-------------------------------------------+
@@ -620,25 +3334,89 @@ def main():
     parser = argparse.ArgumentParser(description='安全社区文章监控脚本')
     parser.add_argument('--once', action='store_true', help='只执行一次，适合GitHub Action运行')
     parser.add_argument('--daily-report', action='store_true', help='生成日报模式，只生成日报不推送')
+    parser.add_argument('--feed-status', action='store_true', help='显示各RSS源的健康状态后退出')
+    parser.add_argument('--search', metavar='QUERY', help='全文搜索已收录的文章，关键词用空格分隔')
+    parser.add_argument('--since', help='搜索时只返回该日期之后的文章，例如 2025-12-01')
+    parser.add_argument('--source', help='搜索时只返回来源包含该名称的文章')
+    parser.add_argument('--limit', type=int, default=20, help='搜索结果数量，默认20')
+    parser.add_argument('--backfill-archive', action='store_true', help='从archive目录的Markdown日报导入历史文章并生成搜索分片')
+    parser.add_argument('--import', dest='import_path', metavar='FILE', help='从OPML或CSV批量导入RSS源，验证通过的追加到rss.yaml')
+    parser.add_argument('--dry-run', action='store_true', help='与--import一起使用，只验证不写入rss.yaml')
+    parser.add_argument('--export', metavar='FILE', help='将rss.yaml中的RSS源及其健康状态导出为OPML')
+    parser.add_argument('--compact', action='store_true', help='立即按保留策略归档旧文章并压缩数据库')
+    parser.add_argument('--shard', help='分片运行，格式为 i/N（i从0开始），只监控按一致性哈希分到第i片的源')
+    parser.add_argument('--profile-startup', action='store_true', help='统计启动各阶段耗时后退出')
     parser.add_argument('--version', action='version', version=f'Rss_monitor {__version__}', help='显示版本号')
     args = parser.parse_args()
     
+    if args.profile_startup:
+        profile_startup()
+        return
+    
+    # 配置只加载一次，之后仅在文件变化时热加载
+    config = get_config()
+    rss_config = get_rss_config()
+    if rss_config is None:
+        return
+    
+    # 分片模式：命令行参数优先于配置文件和环境变量
+    try:
+        shard = parse_shard(args.shard or config.get('shard', {}).get('shard'))
+    except ValueError as e:
+        print(str(e))
+        return
+    vnodes = config.get('shard', {}).get('vnodes', 64)
+    if shard is not None:
+        rss_config = filter_shard(rss_config, shard, vnodes)
+        print(f"分片模式：第 {shard[0]}/{shard[1]} 片，负责 {len(rss_config)} 个RSS源")
+    claim_store = open_claim_store(config)
+    if shard is not None and claim_store is None:
+        print("警告：分片模式未开启共享认领库（shard.claim_backend），不同实例可能重复推送同一链接")
+
     conn = init_database()
     cursor = conn.cursor()
-    rss_config = {}
-
-    try:
-        with open('rss.yaml', 'r', encoding='utf-8') as file:
-            rss_config = yaml.load(file, Loader=yaml.FullLoader)
-    except Exception as e:
-        print(f"加载rss.yaml文件出错: {str(e)}")
-        conn.close()
+    
+    # 查询类命令执行后直接退出
+    if args.feed_status or args.search or args.backfill_archive or args.compact or args.import_path or args.export:
+        try:
+            if args.feed_status:
+                print_feed_status(cursor, rss_config)
+            elif args.import_path:
+                import_feeds(args.import_path, config, args.dry_run)
+            elif args.export:
+                export_opml(args.export, cursor, get_rss_config())
+            elif args.search:
+                print_search_results(cursor, args.search, args.since, args.source, args.limit)
+            elif args.compact:
+                if not apply_retention(conn, config):
+                    print("没有需要归档的文章")
+            else:
+                backfill_archive(conn)
+                write_search_shards(cursor)
+        except Exception as e:
+            print(f"执行失败: {str(e)}")
+        finally:
+            conn.close()
+            if claim_store is not None:
+                claim_store.close()
         return
+    
+    if claim_store is not None:
+        confirm_recent_claims(cursor, claim_store)
+    
+    # 启动时从最近的文章重建近似重复索引
+    dedup = open_dedup_index(cursor, config)
+    
+    # 推送交给后台分发队列，抓取流程不再等待webhook响应
+    dispatcher = PushDispatcher(config)
+    # 收到SIGTERM/SIGINT（如容器重启）时不直接中断，处理完已开始的抓取、送出队列中的推送后再退出
+    stop_event = threading.Event()
+    install_signal_handlers(stop_event)
+    wal = False
 
     # 发送启动通知消息 - 非日报模式才发送
     if not args.daily_report:
         # 检查是否有任何推送服务的开关是开启的
-        config = load_config()
         push_config = config.get('push', {})
         any_push_enabled = False
         
@@ -672,64 +3450,108 @@ def main():
                 'channels': ', '.join(enabled_channels),
                 'mode': run_mode
             }
-            push_message("安全社区文章监控已启动!", f"服务已准备就绪。", extra_data=extra_data)
+            push_message("安全社区文章监控已启动!", f"服务已准备就绪。", extra_data=extra_data, config=config,
+                         dispatcher=dispatcher)
 
     try:
         if args.daily_report:
             # 日报模式，先收集数据，再生成日报
             print("使用日报模式")
-            # 先收集所有RSS源的数据
-            for website, config in rss_config.items():
-                website_name = config.get("website_name")
-                rss_url = config.get("rss_url")
-                # 日报模式下不发送推送，send_push=False
-                check_for_updates(rss_url, website_name, cursor, conn, send_push=False)
+            # 先收集所有RSS源的数据，日报模式下不发送推送，send_push=False
+            run_cycle(rss_config, cursor, conn, send_push=False, config=config, dedup=dedup, stop_event=stop_event)
             # 收集完数据后生成日报
-            generate_daily_report(cursor)
+            generate_daily_report(cursor, config)
+            apply_retention(conn, config)
         elif args.once:
             # 单次执行模式，适合GitHub Action
             print("使用单次执行模式")
-            for website, config in rss_config.items():
-                website_name = config.get("website_name")
-                rss_url = config.get("rss_url")
-                check_for_updates(rss_url, website_name, cursor, conn)
+            run_cycle(rss_config, cursor, conn, config=config, dispatcher=dispatcher, claim_store=claim_store,
+                      dedup=dedup, stop_event=stop_event)
             
             # 检查是否需要生成日报
-            config = load_config()
             if config.get('daily_report', {}).get('switch', 'ON') == 'ON':
-                generate_daily_report(cursor)
+                generate_daily_report(cursor, config)
+            
+            # 等待本次推送完成，未送达的记录留在发件箱中由下次运行重试
+            flush_outbox(conn, config, dispatcher)
+            # 归档超出保留期的文章，数据库大小不随历史增长
+            apply_retention(conn, config)
         else:
-            # 循环执行模式，适合本地运行
-            while True:
+            # 循环执行模式，适合本地运行：每个RSS源按各自的间隔调度
+            start_metrics_server(config)
+            daemon_config = config.get('daemon', {})
+            if daemon_config.get('wal', 'ON') == 'ON':
+                wal = enable_wal(conn)
+            last_checkpoint = time.time()
+            scheduler = FeedScheduler(config)
+            restored = scheduler.load(cursor)
+            if restored:
+                print(f"已恢复 {restored} 个RSS源的调度状态")
+            report_pending = True
+            retention_day = None
+            while not stop_event.is_set():
                 try:
-                    # 检查是否需要夜间休眠
-                    if should_sleep():
-                        sleep_hours = 7 - datetime.now().hour
-                        print(f"当前时间在0-7点之间，将休眠{sleep_hours}小时")
-                        time.sleep(sleep_hours * 3600)
-                        continue
+                    # 每轮开始前检查配置文件是否有变化，新增的RSS源无需重启即可生效
+                    config = get_config()
+                    rss_config = filter_shard(get_rss_config(), shard, vnodes)
+                    dispatcher.update_config(config)
+                    scheduler.update_config(config)
+                    scheduler.sync(rss_config)
                     
-                    for website, config in rss_config.items():
-                        website_name = config.get("website_name")
-                        rss_url = config.get("rss_url")
-                        check_for_updates(rss_url, website_name, cursor, conn)
+                    # 取出已到期的RSS源（处于休眠时段的源会自动顺延）
+                    due = scheduler.pop_due()
+                    if due:
+                        stats = run_cycle({key: rss_config[key] for key in due}, cursor, conn, config=config,
+                                          dispatcher=dispatcher, scheduler=scheduler, claim_store=claim_store,
+                                          dedup=dedup, stop_event=stop_event)
+                        # 每轮结束保存调度状态，重启后从这里继续
+                        scheduler.save(cursor)
+                        conn.commit()
+                        report_pending = report_pending or stats['new'] > 0
+                        if stop_event.is_set():
+                            break
 
-                    # 检查是否需要生成日报
-                    config = load_config()
-                    if config.get('daily_report', {}).get('switch', 'ON') == 'ON':
-                        generate_daily_report(cursor)
+                        # 有新文章时检查是否需要生成日报
+                        if report_pending and config.get('daily_report', {}).get('switch', 'ON') == 'ON':
+                            generate_daily_report(cursor, config)
+                        report_pending = False
+                    
+                    # 每天检查一次数据保留
+                    today = time.strftime('%Y-%m-%d', time.localtime())
+                    if retention_day != today:
+                        apply_retention(conn, config)
+                        retention_day = today
+                    
+                    # 定期执行WAL检查点
+                    if wal and time.time() - last_checkpoint >= config.get('daemon', {}).get('checkpoint_interval', 600):
+                        checkpoint_database(conn)
+                        last_checkpoint = time.time()
 
-                    # 每二小时执行一次
-                    time.sleep(10800)
+                    # 休眠到下一个源到期，最长5分钟检查一次配置变化，等待期间定时重试发件箱中失败的推送
+                    next_due = scheduler.next_due()
+                    wait = 300 if next_due is None else min(300, max(1, next_due - time.time()))
+                    sleep_with_outbox(conn, config, dispatcher, wait, stop_event=stop_event)
 
                 except Exception as e:
                     print("发生异常：", str(e))
-                    time.sleep(60)  # 出现异常，等待1分钟继续执行
+                    stop_event.wait(60)  # 出现异常，等待1分钟继续执行
     except Exception as e:
         print("主程序发生异常：", str(e))
     finally:
+        # 等待队列中的推送发送完毕再退出，超时未送达的记录留在发件箱中由下次运行重试
+        if stop_event.is_set():
+            print("正在等待推送队列发送完毕...")
+        dispatcher.close(config.get('daemon', {}).get('shutdown_timeout', 30))
+        apply_outbox_results(conn, config, dispatcher)
+        if wal:
+            disable_wal(conn)
         conn.close()
+        if claim_store is not None:
+            claim_store.close()
         print("监控程序已结束")
 
+# 模块导入完成的时间点，供 --profile-startup 使用
+_MODULE_READY = time.perf_counter()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
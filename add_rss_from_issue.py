@@ -4,6 +4,7 @@ import yaml
 import json
 import requests
 from github import Github
+from Rss_monitor import append_rss_config, canonical_link, unique_feed_name, validate_feeds
 
 # 从环境变量获取GitHub Token
 token = os.environ.get('GITHUB_TOKEN')
@@ -123,16 +124,36 @@ except Exception as e:
     print(f"读取rss.yaml文件失败：{str(e)}")
     sys.exit(1)
 
-# 添加新的RSS源
-rss_config[website_name] = {
-    'rss_url': rss_url,
-    'website_name': website_name
-}
+# 检查是否已有相同的RSS源（忽略协议、www和跟踪参数）
+existing = next((name for name, feed in rss_config.items()
+                 if feed.get('rss_url') and canonical_link(feed['rss_url']) == canonical_link(rss_url)), None)
+if existing:
+    print(f"RSS源已存在：{existing}")
+    repo = g.get_repo(repo_name)
+    issue = repo.get_issue(number=issue_number)
+    issue.create_comment(f"该RSS源已存在：{existing}\nRSS链接：{rss_config[existing]['rss_url']}")
+    issue.edit(state='closed')
+    sys.exit(0)
+
+# 验证RSS链接能否访问并解析为RSS/Atom
+report = validate_feeds([rss_url])[rss_url]
+if report['error']:
+    print(f"RSS链接验证失败：{report['error']}")
+    repo = g.get_repo(repo_name)
+    issue = repo.get_issue(number=issue_number)
+    issue.create_comment(f"RSS链接验证失败：{report['error']}\n请确认链接可以访问且返回的是RSS/Atom内容")
+    sys.exit(1)
+print(f"RSS链接验证通过：{report['format']}，{report['entries']} 篇文章，耗时 {report['latency']:.2f} 秒")
+
+# 网站名称已被其他RSS链接使用时加上序号，不覆盖已有的源
+requested_name = website_name
+website_name = unique_feed_name(website_name, rss_config)
+if website_name != requested_name:
+    print(f"网站名称 {requested_name} 已存在，改用 {website_name}")
 
-# 保存更新后的rss.yaml文件
+# 追加新的RSS源到rss.yaml末尾，保留原有内容和注释，写入临时文件后替换
 try:
-    with open('rss.yaml', 'w', encoding='utf-8') as f:
-        yaml.dump(rss_config, f, allow_unicode=True, default_flow_style=False)
+    append_rss_config({website_name: {'rss_url': rss_url, 'website_name': website_name}})
     print(f"成功将新RSS源添加到rss.yaml")
     
 except Exception as e:
@@ -143,7 +164,8 @@ except Exception as e:
 try:
     repo = g.get_repo(repo_name)
     issue = repo.get_issue(number=issue_number)
-    issue.create_comment(f"成功添加RSS源：\n网站名称：{website_name}\nRSS链接：{rss_url}")
+    renamed = f"\n（名称 {requested_name} 已被其他RSS源使用，已自动改名）" if website_name != requested_name else ''
+    issue.create_comment(f"成功添加RSS源：\n网站名称：{website_name}\nRSS链接：{rss_url}{renamed}")
     issue.edit(state='closed')
     print(f"成功回复并关闭Issue #{issue_number}")
     
@@ -0,0 +1,252 @@
+# 抓取流程基准测试：使用本地模拟服务（见 mock_server.py），分别测量 check_for_updates 的单源耗时
+# 和完整 --once 运行的耗时、峰值内存、数据库增长以及webhook推送量
+# 用法：python benchmarks/bench_pipeline.py --feeds 10,100,1000,10000 --latency 20 --output bench.json
+#       python benchmarks/bench_pipeline.py --feeds 100 --baseline bench.json   # 与之前的结果对比
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import Rss_monitor
+from mock_server import MockServer
+
+SCRIPT = os.path.join(ROOT_DIR, 'Rss_monitor.py')
+# --once 各轮的场景：首次全部收录、内容未变化（304）、所有源都有新文章
+CYCLE_MODES = ('cold', 'unchanged', 'updated')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def db_size(workdir):
+    total = 0
+    for suffix in ('', '-wal', '-shm'):
+        path = os.path.join(workdir, 'articles.db' + suffix)
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def telegram_available():
+    try:
+        import telegram  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# 在临时目录中写入指向模拟服务的 config.yaml 和 rss.yaml
+def write_workdir(workdir, server, args):
+    rss = {
+        f'bench-{i}': {'rss_url': server.feed_url(i), 'website_name': f'基准源{i}'}
+        for i in range(server.feeds)
+    }
+    push = {
+        'dingding': {'webhook': server.webhook_url('dingtalk') + '?access_token=bench', 'secret_key': 'SECbench',
+                     'switch': 'ON'},
+        'feishu': {'webhook': server.webhook_url('feishu'), 'switch': 'ON'},
+        'tg_bot': {'token': 'bench', 'group_id': '1', 'api_url': server.base_url + '/bot',
+                   'switch': 'ON' if telegram_available() else 'OFF'},
+        'discard': {'webhook': server.webhook_url('discord'), 'switch': 'ON', 'send_daily_report': 'OFF'},
+    }
+    config = {
+        'push': push,
+        'night_sleep': {'switch': 'OFF'},
+        'daily_report': {'switch': 'ON' if args.report else 'OFF'},
+        'fetch': {'max_workers': args.workers},
+        'dispatch': {'batch_window': 0.2, 'rate_limits': {name: 0 for name in push}},
+        'outbox': {'flush_timeout': 600},
+        'metrics': {'switch': 'OFF', 'summary': 'ON'},
+        'proxy': {'enable': 'OFF'},
+    }
+    with open(os.path.join(workdir, 'rss.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(rss, f, allow_unicode=True)
+    with open(os.path.join(workdir, 'config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+
+# 在当前进程中逐个调用 check_for_updates（同步抓取+解析+入库），统计单源耗时
+def bench_check_for_updates(workdir, server, sample):
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        config = Rss_monitor.get_config()
+        conn = Rss_monitor.init_database()
+        cursor = conn.cursor()
+        latencies = []
+        devnull = open(os.devnull, 'w', encoding='utf-8')
+        for i in range(min(sample, server.feeds)):
+            start = time.perf_counter()
+            # 不输出每个源的监控日志，避免打印耗时影响结果
+            with contextlib.redirect_stdout(devnull):
+                Rss_monitor.check_for_updates(server.feed_url(i), f'基准源{i}', cursor, conn, send_push=False,
+                                              source=f'bench-{i}', config=config)
+            latencies.append((time.perf_counter() - start) * 1000)
+        devnull.close()
+        conn.close()
+    finally:
+        os.chdir(cwd)
+    # 清空数据库，--once 从冷启动开始
+    for suffix in ('', '-wal', '-shm'):
+        path = os.path.join(workdir, 'articles.db' + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+    }
+
+
+# 以子进程运行一次 --once，返回耗时、峰值内存和本轮JSON汇总
+def run_once(workdir, server, mode):
+    if mode == 'updated':
+        server.bump()
+    server.reset_stats()
+    size_before = db_size(workdir)
+    log_path = os.path.join(workdir, f'once-{mode}.log')
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen([sys.executable, SCRIPT, '--once'], cwd=workdir, stdout=log,
+                                   stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+
+    summary = {}
+    with open(log_path, encoding='utf-8') as log:
+        for line in log:
+            if line.startswith('{"event": "cycle"'):
+                summary = json.loads(line)
+    size_after = db_size(workdir)
+    stats = server.stats()
+    return {
+        'mode': mode,
+        'exit_code': process.returncode,
+        'seconds': round(seconds, 3),
+        'cycles_per_sec': round(1 / seconds, 3) if seconds else 0.0,
+        'peak_rss_kb': usage.ru_maxrss,
+        'db_bytes': size_after,
+        'db_growth_bytes': size_after - size_before,
+        'feed_requests': stats['feed_requests'],
+        'not_modified': stats['not_modified'],
+        'webhooks': stats['webhooks'],
+        'cycle': {key: summary.get(key) for key in ('elapsed', 'stats', 'stages')},
+    }
+
+
+def bench_feeds(count, args):
+    server = MockServer(count, args.items, args.summary_bytes, args.latency / 1000, args.jitter / 1000,
+                        args.format, new_items=args.new_items).start()
+    workdir = tempfile.mkdtemp(prefix=f'rss-bench-{count}-')
+    try:
+        write_workdir(workdir, server, args)
+        result = {'feeds': count, 'workdir': workdir if args.keep else None}
+        result['check_for_updates'] = bench_check_for_updates(workdir, server, args.sample)
+        result['cycles'] = [run_once(workdir, server, mode) for mode in CYCLE_MODES]
+        return result
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_result(result):
+    check = result['check_for_updates']
+    print(f"\n== {result['feeds']} 个源 ==")
+    print(f"check_for_updates: {check['calls']} 次，p50 {check['p50_ms']:.2f} ms，p99 {check['p99_ms']:.2f} ms，"
+          f"平均 {check['mean_ms']:.2f} ms")
+    print(f"{'场景':<10} {'耗时(s)':>8} {'轮/秒':>8} {'峰值内存(MB)':>12} {'数据库(KB)':>10} {'增长(KB)':>9} "
+          f"{'请求数':>7} {'304':>6}  webhook")
+    for cycle in result['cycles']:
+        webhooks = ', '.join(f'{k}={v}' for k, v in sorted(cycle['webhooks'].items()))
+        print(f"{cycle['mode']:<10} {cycle['seconds']:>8.2f} {cycle['cycles_per_sec']:>8.3f} "
+              f"{cycle['peak_rss_kb'] / 1024:>12.1f} {cycle['db_bytes'] / 1024:>10.1f} "
+              f"{cycle['db_growth_bytes'] / 1024:>9.1f} {cycle['feed_requests']:>7} {cycle['not_modified']:>6}  {webhooks}")
+        if cycle['exit_code']:
+            print(f"  警告：--once 退出码 {cycle['exit_code']}")
+
+
+# 与之前保存的结果对比：按源数量和场景比较耗时与峰值内存
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {item['feeds']: item for item in json.load(f)['results']}
+    print(f"\n与基线对比（{baseline_path}）：")
+    for result in results:
+        base = baseline.get(result['feeds'])
+        if not base:
+            continue
+        base_check = base['check_for_updates']
+        check = result['check_for_updates']
+        if base_check['p50_ms']:
+            print(f"{result['feeds']:>6} 个源 check_for_updates p50 {check['p50_ms'] / base_check['p50_ms'] - 1:+.1%}")
+        base_cycles = {cycle['mode']: cycle for cycle in base['cycles']}
+        for cycle in result['cycles']:
+            old = base_cycles.get(cycle['mode'])
+            if old and old['seconds']:
+                print(f"{result['feeds']:>6} 个源 {cycle['mode']:<10} 耗时 {cycle['seconds'] / old['seconds'] - 1:+.1%}，"
+                      f"峰值内存 {cycle['peak_rss_kb'] / old['peak_rss_kb'] - 1:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RSS抓取流程基准测试')
+    parser.add_argument('--feeds', default='10,100,1000', help='RSS源数量列表，逗号分隔（最大可到10000）')
+    parser.add_argument('--items', type=int, default=20, help='每个源的文章数')
+    parser.add_argument('--new-items', type=int, default=5, help='"updated" 场景中每个源新增的文章数')
+    parser.add_argument('--summary-bytes', type=int, default=200, help='每篇文章摘要的字节数')
+    parser.add_argument('--latency', type=float, default=0, help='模拟源的固定响应延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='模拟源的随机附加延迟上限（毫秒）')
+    parser.add_argument('--format', choices=['rss', 'atom', 'mixed'], default='mixed', help='源格式')
+    parser.add_argument('--workers', type=int, default=16, help='--once 运行时的并发抓取数')
+    parser.add_argument('--sample', type=int, default=200, help='check_for_updates 测量的源数量上限')
+    parser.add_argument('--report', action='store_true', help='--once 运行时同时生成日报')
+    parser.add_argument('--keep', action='store_true', help='保留临时工作目录，便于查看日志')
+    parser.add_argument('--output', help='将结果保存为JSON文件')
+    parser.add_argument('--baseline', help='与之前保存的JSON结果对比')
+    args = parser.parse_args()
+
+    results = []
+    for count in [int(c) for c in args.feeds.split(',') if c]:
+        result = bench_feeds(count, args)
+        results.append(result)
+        print_result(result)
+    print(f"\n基准进程峰值内存：{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    if args.output:
+        meta = {
+            'version': Rss_monitor.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': Rss_monitor.sqlite3.sqlite_version,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+            'args': vars(args),
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
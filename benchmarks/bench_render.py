@@ -0,0 +1,77 @@
+# 日报渲染基准测试：统计Markdown/HTML日报和index.html的渲染耗时随文章数的变化
+# 用法：python benchmarks/bench_render.py --counts 10,100,1000,10000 --repeat 5
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import Rss_monitor
+
+
+# 生成指定数量的模拟文章
+def make_articles(count):
+    return [
+        {
+            'title': f'模拟文章 {i} CVE-2024-{1000 + i}',
+            'link': f'https://example.com/posts/{i}',
+            'timestamp': '2024-01-01 12:00:00'
+        }
+        for i in range(count)
+    ]
+
+
+# 重复渲染取中位数，返回毫秒
+def time_render(template, repeat, **context):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        template.render(**context)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日报渲染基准测试')
+    parser.add_argument('--counts', default='10,100,1000,10000', help='文章数量列表，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每个数量重复渲染的次数')
+    parser.add_argument('--output', help='将结果保存为JSON文件')
+    args = parser.parse_args()
+
+    # 在项目目录下运行，使用与正式运行相同的模板和缓存目录
+    os.chdir(ROOT_DIR)
+    env = Rss_monitor.get_template_env()
+
+    # 首次加载包含编译（或读取字节码缓存），单独统计
+    start = time.perf_counter()
+    templates = {name: env.get_template(name) for name in ('template.md', 'template.html', 'index_template.html')}
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"模板加载耗时：{load_ms:.2f} ms")
+
+    results = []
+    print(f"{'文章数':>8} {'Markdown(ms)':>14} {'HTML(ms)':>10} {'index(ms)':>10}")
+    for count in [int(c) for c in args.counts.split(',') if c]:
+        articles = make_articles(count)
+        context = {'date': '2024-01-01', 'count': count, 'update_time': '2024-01-01 12:00:00', 'articles': articles}
+        reports = [{'date': f'day-{i}', 'path': f'archive/day-{i}/Daily.html', 'count': i} for i in range(count)]
+        row = {
+            'articles': count,
+            'markdown_ms': time_render(templates['template.md'], args.repeat, **context),
+            'html_ms': time_render(templates['template.html'], args.repeat, **context),
+            'index_ms': time_render(templates['index_template.html'], args.repeat, reports=reports)
+        }
+        results.append(row)
+        print(f"{count:>8} {row['markdown_ms']:>14.2f} {row['html_ms']:>10.2f} {row['index_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'template_load_ms': load_ms, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.output}")
+
+
+if __name__ == '__main__':
+    main()
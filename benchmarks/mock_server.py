@@ -0,0 +1,213 @@
+# 本地模拟服务：提供N个合成的RSS/Atom源，并模拟钉钉、飞书、Telegram、Discord的webhook接收端
+# 用法：python benchmarks/mock_server.py --feeds 100 --items 20 --latency 50 --port 8765
+#   GET  /feed/<i>.xml  第i个RSS源（偶数为RSS 2.0，奇数为Atom），支持ETag条件请求
+#   POST /_bump         所有源各新增若干篇文章（--new-items），用于模拟有更新的轮次
+#   GET  /_stats        webhook接收统计（JSON）
+#   POST 其他路径        webhook接收端，按渠道返回对应格式的成功响应
+import argparse
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+# 生成第i个源在第gen批次时的内容，最新的文章在前
+def build_feed(index, gen, items, summary_bytes, feed_format, new_items):
+    newest = gen * new_items + items
+    entries = range(newest - 1, newest - 1 - items, -1)
+    summary = escape(('漏洞分析 CVE-2024-%d ' % index) * max(1, summary_bytes // 24))[:summary_bytes]
+    base = 1704067200
+    if feed_format == 'atom':
+        body = ''.join(
+            f'<entry><title>源{index} 文章{n}</title>'
+            f'<link href="http://bench.local/{index}/{n}"/><id>bench:{index}:{n}</id>'
+            f'<updated>{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(base + n * 3600))}</updated>'
+            f'<author><name>bench</name></author><summary>{summary}</summary></entry>'
+            for n in entries
+        )
+        return (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f'<title>源{index}</title><id>bench:{index}</id>{body}</feed>').encode('utf-8')
+    body = ''.join(
+        f'<item><title>源{index} 文章{n}</title><link>http://bench.local/{index}/{n}</link>'
+        f'<guid>bench:{index}:{n}</guid><pubDate>{formatdate(base + n * 3600, usegmt=True)}</pubDate>'
+        f'<category>bench</category><description>{summary}</description></item>'
+        for n in entries
+    )
+    return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>源{index}</title>'
+            f'<link>http://bench.local/{index}</link><ttl>60</ttl>{body}</channel></rss>').encode('utf-8')
+
+
+class MockServer:
+    def __init__(self, feeds=10, items=20, summary_bytes=200, latency=0.0, jitter=0.0, feed_format='mixed',
+                 host='127.0.0.1', port=0, new_items=5):
+        self.feeds = feeds
+        self.items = items
+        self.new_items = new_items
+        self.summary_bytes = summary_bytes
+        self.latency = latency
+        self.jitter = jitter
+        self.feed_format = feed_format
+        self.gen = 0
+        self.lock = threading.Lock()
+        self.webhooks = {}
+        self.feed_requests = 0
+        self.not_modified = 0
+        self.cache = {}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 1024
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def feed_url(self, index):
+        return f'{self.base_url}/feed/{index}.xml'
+
+    def webhook_url(self, channel):
+        return f'{self.base_url}/{channel}'
+
+    def format_of(self, index):
+        if self.feed_format == 'mixed':
+            return 'atom' if index % 2 else 'rss'
+        return self.feed_format
+
+    def body(self, index, gen):
+        key = (index, gen)
+        body = self.cache.get(key)
+        if body is None:
+            body = build_feed(index, gen, self.items, self.summary_bytes, self.format_of(index),
+                              self.new_items)
+            self.cache[key] = body
+        return body
+
+    def bump(self):
+        with self.lock:
+            self.gen += 1
+            self.cache = {}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'feed_requests': self.feed_requests,
+                'not_modified': self.not_modified,
+                'webhooks': dict(self.webhooks),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.feed_requests = 0
+            self.not_modified = 0
+            self.webhooks = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body=b'', content_type='application/json', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/_stats':
+                    self._reply(200, json.dumps(server.stats()).encode('utf-8'))
+                    return
+                if not path.startswith('/feed/'):
+                    self._reply(404)
+                    return
+                try:
+                    index = int(path[len('/feed/'):].split('.')[0])
+                except ValueError:
+                    self._reply(404)
+                    return
+                if index >= server.feeds:
+                    self._reply(404)
+                    return
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + random.uniform(0, server.jitter))
+                with server.lock:
+                    server.feed_requests += 1
+                    gen = server.gen
+                etag = f'"{index}-{gen}"'
+                if self.headers.get('If-None-Match') == etag:
+                    with server.lock:
+                        server.not_modified += 1
+                    self._reply(304, headers={'ETag': etag})
+                    return
+                content_type = 'application/atom+xml' if server.format_of(index) == 'atom' else 'application/rss+xml'
+                self._reply(200, server.body(index, gen), content_type + '; charset=utf-8', {'ETag': etag})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                path = self.path.split('?')[0]
+                if path == '/_bump':
+                    server.bump()
+                    self._reply(200, b'{}')
+                    return
+                channel = path.strip('/').split('/')[0] or 'unknown'
+                if channel.startswith('bot'):
+                    channel = 'telegram'
+                with server.lock:
+                    server.webhooks[channel] = server.webhooks.get(channel, 0) + 1
+                if channel == 'discord':
+                    self._reply(204)
+                elif channel == 'telegram':
+                    result = {'message_id': 1, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'group'}}
+                    self._reply(200, json.dumps({'ok': True, 'result': result}).encode('utf-8'))
+                else:
+                    self._reply(200, b'{"errcode": 0, "errmsg": "ok", "code": 0}')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟RSS源和推送webhook的本地服务')
+    parser.add_argument('--feeds', type=int, default=10, help='RSS源数量')
+    parser.add_argument('--items', type=int, default=20, help='每个源的文章数')
+    parser.add_argument('--new-items', type=int, default=5, help='每次 /_bump 每个源新增的文章数')
+    parser.add_argument('--summary-bytes', type=int, default=200, help='每篇文章摘要的字节数')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='每个请求的随机附加延迟上限（毫秒）')
+    parser.add_argument('--format', choices=['rss', 'atom', 'mixed'], default='mixed', help='源格式')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = MockServer(args.feeds, args.items, args.summary_bytes, args.latency / 1000, args.jitter / 1000,
+                        args.format, args.host, args.port, args.new_items)
+    print(f"模拟服务已启动：{server.base_url}，共 {args.feeds} 个源")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
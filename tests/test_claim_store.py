@@ -0,0 +1,91 @@
+import sqlite3
+import time
+
+import pytest
+
+from Rss_monitor import MemoryClaimStore, SqliteClaimStore
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def make_store(request, tmp_path):
+    stores = []
+    shared = MemoryClaimStore()
+    
+    def make(node, lease=300):
+        config = {'node': node, 'claim_lease': lease, 'claim_path': str(tmp_path / 'claims.db')}
+        if request.param == 'sqlite':
+            store = SqliteClaimStore(config)
+        else:
+            # 内存后端模拟多个实例共享同一份认领记录
+            store = MemoryClaimStore(config)
+            store.lock, store.claimed = shared.lock, shared.claimed
+        stores.append(store)
+        return store
+    
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_claim_empty_input(make_store):
+    assert make_store('a').claim([]) == (set(), set())
+
+
+def test_first_claim_wins_and_pending_is_busy(make_store):
+    a, b = make_store('a'), make_store('b')
+    assert a.claim(['h1', 'h2']) == ({'h1', 'h2'}, set())
+    assert b.claim(['h1', 'h3']) == ({'h3'}, {'h1'})
+
+
+def test_same_node_reclaims_pending(make_store):
+    a = make_store('a')
+    a.claim(['h1'])
+    assert a.claim(['h1', 'h1']) == ({'h1'}, set())
+
+
+def test_confirmed_claim_is_final(make_store):
+    a, b = make_store('a'), make_store('b')
+    a.claim(['h1'])
+    a.confirm(['h1'])
+    assert b.claim(['h1']) == (set(), set())
+    assert a.claim(['h1']) == (set(), set())
+
+
+def test_expired_lease_is_taken_over(make_store):
+    a, b = make_store('a', lease=0.05), make_store('b')
+    a.claim(['h1'])
+    time.sleep(0.1)
+    assert b.claim(['h1']) == ({'h1'}, set())
+    # 原实例确认时认领已属于其他实例，不能覆盖
+    a.confirm(['h1'])
+    b.confirm(['h1'])
+    assert a.claim(['h1']) == (set(), set())
+
+
+def test_confirm_only_own_claims(make_store):
+    a, b = make_store('a'), make_store('b')
+    a.claim(['h1'])
+    b.confirm(['h1'])
+    assert b.claim(['h1']) == (set(), {'h1'})
+
+
+def test_sqlite_claim_batches(tmp_path):
+    store = SqliteClaimStore({'node': 'a', 'claim_path': str(tmp_path / 'claims.db')})
+    hashes = [f'h{i}' for i in range(1200)]
+    assert store.claim(hashes, batch_size=500) == (set(hashes), set())
+    store.confirm(hashes, batch_size=500)
+    assert store.claim(hashes + ['new'], batch_size=500) == ({'new'}, set())
+    store.close()
+
+
+def test_sqlite_upgrades_old_claims_table(tmp_path):
+    path = str(tmp_path / 'claims.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE claims (link_hash TEXT PRIMARY KEY, node TEXT, claimed_at REAL)")
+    conn.execute("INSERT INTO claims VALUES ('h1', 'a', ?)", (time.time(),))
+    conn.commit()
+    conn.close()
+    store = SqliteClaimStore({'node': 'b', 'claim_path': path})
+    # 旧版记录视为已确认
+    assert store.claim(['h1', 'h2']) == ({'h2'}, set())
+    store.close()
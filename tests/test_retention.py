@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import Rss_monitor
+from Rss_monitor import (apply_retention, index_items, init_database, link_hash, pack_summary,
+                         print_search_results, search_archive_shards, search_items)
+
+
+def add_items(conn, items):
+    cursor = conn.cursor()
+    last_id = cursor.execute("SELECT IFNULL(MAX(id), 0) FROM items").fetchone()[0]
+    with conn:
+        cursor.executemany(
+            "INSERT INTO items (title, link, link_hash, source, timestamp, summary) VALUES (?, ?, ?, ?, ?, ?)",
+            [(title, link, link_hash(link), source, timestamp, pack_summary(summary))
+             for title, link, source, timestamp, summary in items]
+        )
+        index_items(cursor, {link_hash(link): summary for title, link, source, timestamp, summary in items}, last_id)
+
+
+def db_size(conn):
+    conn.execute("VACUUM")
+    return os.path.getsize('articles.db')
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conn = init_database()
+    if Rss_monitor.fts_tokenizer(conn.cursor()) is None:
+        pytest.skip('SQLite不支持FTS5')
+    recent = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    add_items(conn, [
+        (f'Nginx 漏洞分析 {i}', f'https://old.example/{i}', 'FreeBuf', f'2025-01-{i % 28 + 1:02d} 08:00:00',
+         f'第{i}篇旧文章的摘要，' + '详细的复现过程和修复建议。' * 40)
+        for i in range(300)
+    ])
+    add_items(conn, [('Redis 未授权访问', 'https://new.example/1', '奇安信', recent, 'Redis 未授权访问的利用方式')])
+    yield conn
+    conn.close()
+
+
+def fts_integrity_check(conn):
+    with conn:
+        conn.execute("INSERT INTO items_fts (items_fts) VALUES ('integrity-check')")
+
+
+def test_retention_shrinks_database(conn):
+    before = db_size(conn)
+    assert apply_retention(conn, {'retention': {'hot_days': 30}}) == 300
+    after = db_size(conn)
+    assert after < before / 3
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+    fts_integrity_check(conn)
+
+
+def test_archived_items_are_dropped_from_index(conn):
+    apply_retention(conn, {'retention': {'hot_days': 30}})
+    assert conn.execute("SELECT COUNT(*) FROM items_fts WHERE items_fts MATCH 'Nginx'").fetchone()[0] == 0
+    assert [row[0] for row in search_items(conn.cursor(), 'Redis')] == ['Redis 未授权访问']
+
+
+def test_archived_items_stay_searchable(conn, capsys):
+    apply_retention(conn, {'retention': {'hot_days': 30}})
+    with gzip.open('archive/db/items-2025-01.jsonl.gz', 'rt', encoding='utf-8') as f:
+        assert len([line for line in f if line.strip()]) == 300
+    with open('archive/search/manifest.json', encoding='utf-8') as f:
+        assert json.load(f)['shards'] == ['archive/search/2025-01.json']
+    
+    results = search_archive_shards('nginx 漏洞', limit=5)
+    assert len(results) == 5
+    assert all(title.startswith('Nginx 漏洞分析') for title, link, source, date, snippet in results)
+    assert search_archive_shards('nginx', source='奇安信') == []
+    assert search_archive_shards('nginx', since='2025-02-01') == []
+    
+    print_search_results(conn.cursor(), 'Nginx')
+    assert 'https://old.example/' in capsys.readouterr().out
+
+
+def test_retention_keeps_recent_months(conn):
+    assert apply_retention(conn, {'retention': {'hot_days': 30}}) == 300
+    assert apply_retention(conn, {'retention': {'hot_days': 30}}) == 0
+    assert apply_retention(conn, {'retention': {'switch': 'OFF'}}) == 0
+    fts_integrity_check(conn)
@@ -0,0 +1,59 @@
+from Rss_monitor import RulesEngine
+
+CHANNELS = ['dingding', 'feishu', 'tg_bot', 'discard']
+
+
+def make_engine(*rules, default_channels='all'):
+    return RulesEngine({'default_channels': default_channels, 'rules': list(rules)})
+
+
+def test_overlapping_regex_rules_all_match():
+    engine = make_engine(
+        {'name': 'a', 'regex': ['rce'], 'channels': ['feishu']},
+        {'name': 'b', 'regex': ['remote code execution|rce'], 'channels': ['dingding']},
+    )
+    assert engine.route('New RCE bug', '', 'src', CHANNELS) == (['dingding', 'feishu'], ['a', 'b'])
+
+
+def test_drop_rule_overlapping_route_rule_wins():
+    engine = make_engine(
+        {'name': 'a', 'regex': ['rce'], 'channels': ['feishu']},
+        {'name': 'b', 'regex': ['remote code execution|rce'], 'channels': ['dingding']},
+        {'name': 'ads', 'regex': ['rce.{0,5}广告'], 'action': 'drop'},
+    )
+    channels, names = engine.route('RCE 广告 promotion', '', 'src', CHANNELS)
+    assert channels == []
+    assert 'ads' in names
+
+
+def test_no_match_uses_default_channels():
+    engine = make_engine({'name': 'a', 'regex': ['rce'], 'channels': ['feishu']}, default_channels=['tg_bot'])
+    assert engine.route('Weekly newsletter', '', 'src', CHANNELS) == (['tg_bot'], [])
+
+
+def test_uncombinable_patterns_match_standalone():
+    engine = make_engine(
+        {'name': 'flags', 'regex': ['(?i)foo'], 'channels': ['feishu']},
+        {'name': 'backref', 'regex': [r'(ab)\1'], 'channels': ['dingding']},
+    )
+    assert engine.route('FOO', '', 'src', CHANNELS) == (['feishu'], ['flags'])
+    assert engine.route('abab', '', 'src', CHANNELS) == (['dingding'], ['backref'])
+    assert engine.route('aba', '', 'src', CHANNELS) == (CHANNELS, [])
+
+
+def test_duplicate_group_names_fall_back_to_standalone():
+    engine = make_engine(
+        {'name': 'c', 'regex': ['bar(?P<n>z)'], 'channels': ['feishu']},
+        {'name': 'd', 'regex': ['qux(?P<n>z)'], 'channels': ['dingding']},
+    )
+    assert engine.route('barz quxz', '', 'src', CHANNELS) == (['dingding', 'feishu'], ['c', 'd'])
+
+
+def test_keyword_and_cvss_rules():
+    engine = make_engine(
+        {'name': 'kw', 'keywords': ['Exchange'], 'channels': ['tg_bot']},
+        {'name': 'critical', 'min_cvss': 9, 'channels': ['discard']},
+    )
+    channels, names = engine.route('Exchange 漏洞', 'CVSS v3.1 base score 9.8', 'src', CHANNELS)
+    assert channels == ['tg_bot', 'discard']
+    assert names == ['kw', 'critical']